@@ -1,7 +1,6 @@
 import streamlit as st
 from src.core import config
 from src.app_utils.helper import *
-from src.loader import load_json
 import polars as pl
 
 # Remove default padding
@@ -17,10 +16,11 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-df = load_data()
+section_index = load_section_index()
+cube = load_price_cube()
 polygon_data = load_cadastre_data()
-adjacing_sections = load_json(config.data_dir / "cadastre" / "adjency_cadastre.json")
-sections = df.get_column('section').unique().sort().to_list()
+adjacing_sections = load_adjacency_data()
+sections = section_index.sections
 
 st.title("Price evolution overview")
 
@@ -61,8 +61,8 @@ with col2:
     )
     st.plotly_chart(fig)
 
-filtered_df = df.pipe(filter_data, housing_type, section_choice)
-section_stats = filtered_df.pipe(calculate_stats)
+filtered_df = filter_data(section_index, housing_type, section_choice)
+section_stats = cube.pipe(filter_cube, section_choice, housing_type).pipe(calculate_stats)
 st.markdown("<br><br>", unsafe_allow_html=True)
 col1, col2 = st.columns(2)
 
@@ -100,23 +100,7 @@ with col2:
     )
 
 
-transactions_to_show = (
-    filtered_df
-    .filter(
-        pl.col('surface_category') == surface_selection,
-        pl.col('year').is_between(year_range[0], year_range[1])
-    )
-    .with_columns(
-        pl.col('date_mutation').cast(str)
-    )
-    .with_columns(pl.col('prix_m2').round(0))
-    .sort("section", 'year', "prix_m2", descending=[False, True, True])
-    .select(
-        "section", "date_mutation", "prix_m2", "surface_reelle_bati", "valeur_fonciere","parcelle",
-        "type_local", "nombre_pieces_principales", "voie"
-    )
-    #.sort("section", 'date_mutation', "prix_m2", descending=[False, True, True])
-)
+transactions_to_show = format_transactions(filtered_df, surface_selection, year_range)
 
 nb_transactions = len(transactions_to_show)
 st.write(f"{nb_transactions} transactions for years {year_range[0]}-{year_range[1]} on {surface_selection} surfaces")
@@ -131,7 +115,11 @@ with col1:
         #parcelle_choice = st.selectbox('Optional: select a parcel:', list_parcelles)
 
 if parcelle_choice != "All parcelles":
-    transactions_to_show = transactions_to_show.filter(pl.col('parcelle') == parcelle_choice)
+    transactions_to_show = (
+        section_index.parcel_rows(parcelle_choice)
+        .pipe(filter_data, housing_type, section_choice)
+        .pipe(format_transactions, surface_selection, year_range)
+    )
     
 st.dataframe(transactions_to_show)
 
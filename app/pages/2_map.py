@@ -1,11 +1,7 @@
 import streamlit as st
 from src.core import config
 from src.app_utils.helper import *
-from src.loader import load_json
 import polars as pl
-import plotly.graph_objects as go
-import plotly.express as px
-import numpy as np
 
 st.markdown("""
     <style>
@@ -19,14 +15,10 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-df = load_data()
+cube = load_price_cube()
 polygon_data = load_cadastre_data()
-adjacing_sections = load_json(config.data_dir / "cadastre" / "adjency_cadastre.json")
-adjacing_sections_df = pl.DataFrame({
-    "section": adjacing_sections.keys(),
-    "adjacing_sections": adjacing_sections.values(),
-})
-sections = df.get_column('section').unique().sort().to_list()
+adjacing_sections = load_adjacency_data()
+sections = cube.get_column('section').cast(pl.String).unique().sort().to_list()
 
 col1, col2, col3, col4 = st.columns(4)
 with col1:
@@ -55,10 +47,12 @@ with col4:
         step=1
     )
 smooth_price = st.checkbox('Smooth price with adjencing neighborhoods:')
-df_stats = df.pipe(average_price_per_neighborhood, adjacing_sections_df) if smooth_price else df
 
 granularity = ["year", "section"] if show_growth else ["section"]
-stats = calculate_price_per_zone(df_stats, surface_selection, year_range, metric, granularity)
+stats = calculate_price_per_zone(
+    cube, surface_selection, year_range, metric, granularity,
+    adjacing_sections if smooth_price else None
+)
 stats = stats.pipe(calculate_price_growth, year_range, "section") if show_growth else stats
 
 housing_prices = {dic["section"]: dic["prix_m2"] for dic in stats.to_dicts()}
@@ -94,21 +88,13 @@ with col2:
     )
     st.plotly_chart(fig)
 
-stats_section = map_calculate_stats_sections(df, adjacing_sections,year_range, surface_selection, section_choice)
+stats_section = map_calculate_stats_sections(cube, adjacing_sections,year_range, surface_selection, section_choice)
 #st.dataframe(stats_section)
 
-fig = px.bar(stats_section, 
-             x='price_type', 
-             y='price',
-             color='section_type',
-             barmode='group',
-             text='price',
-             title='Mean and Median Prices by Section Type')
-fig.update_traces(textposition='outside', 
-                  texttemplate='<b>€%{text}</b>')
+fig = plot_section_comparison(stats_section)
 st.plotly_chart(fig)
 
-evolution_sections = map_calculate_evolution(df, section_choice, adjacing_sections, surface_selection)
+evolution_sections = map_calculate_evolution(cube, section_choice, adjacing_sections, surface_selection)
 col1, col2 = st.columns(2)
 with col1:
     metric_left = "mean_price_m2"
@@ -0,0 +1,123 @@
+from src.core import config
+from src.cadastres.adjacency_graph import AdjacencyGraph
+from src.cadastres.level_of_detail import lod_dir, lod_zooms
+from shapely.geometry.base import BaseGeometry
+from collections import OrderedDict
+from functools import wraps
+import polars as pl
+import numpy as np
+import hashlib
+import threading
+
+# artifacts whose modification invalidates every cached result
+dataset_paths = [
+    config.data_dir / "cleaned" / "data_nice_cleaned.parquet",
+    config.data_dir / "cleaned" / "data_nice_cleaned.csv",
+    config.data_dir / "cleaned" / "price_cube.parquet",
+    config.data_dir / "cadastre" / "sections-store" / "metadata.json",
+    config.data_dir / "cadastre" / "adjacency-graph" / "indices.npy",
+    config.data_dir / "cadastre" / "adjency_cadastre.json",
+    config.data_dir / "published" / "CURRENT",
+    *[lod_dir / f"zoom_{zoom}" / "metadata.json" for zoom in lod_zooms]
+]
+
+def dataset_version()->str:
+    """Id of the current data artifacts, from their modification times."""
+    stamps = [f"{path}:{path.stat().st_mtime_ns}" for path in dataset_paths if path.exists()]
+    return hashlib.sha1("|".join(stamps).encode()).hexdigest()
+
+def series_is_list(series: pl.Series)->bool:
+    return isinstance(series.dtype, pl.List)
+
+def update_hash(hasher, obj)->None:
+    """Feed a stable, content-based representation of `obj` to `hasher`."""
+    if isinstance(obj, pl.DataFrame):
+        hasher.update(f"df{obj.schema}{obj.shape}".encode())
+        for series in obj.iter_columns():
+            update_hash(hasher, series)
+    elif isinstance(obj, pl.Series):
+        if series_is_list(obj):
+            update_hash(hasher, obj.list.len())
+            obj = obj.explode()
+        hasher.update(obj.hash(seed=0).to_numpy().tobytes())
+    elif isinstance(obj, AdjacencyGraph):
+        hasher.update(b"graph")
+        hasher.update(np.asarray(obj.indptr).tobytes())
+        hasher.update(np.asarray(obj.indices).tobytes())
+        update_hash(hasher, obj.names)
+    elif isinstance(obj, BaseGeometry):
+        hasher.update(obj.wkb)
+    elif isinstance(obj, dict):
+        hasher.update(b"dict")
+        for key, value in obj.items():
+            update_hash(hasher, key)
+            update_hash(hasher, value)
+    elif isinstance(obj, (list, tuple)):
+        hasher.update(f"{type(obj).__name__}{len(obj)}".encode())
+        for value in obj:
+            update_hash(hasher, value)
+    else:
+        hasher.update(f"{type(obj).__name__}:{obj!r}".encode())
+
+def stable_hash(*objs)->str:
+    hasher = hashlib.sha1()
+    for obj in objs:
+        update_hash(hasher, obj)
+    return hasher.hexdigest()
+
+class ResultCache:
+    """Process-wide LRU cache of helper results, shared by every Streamlit session.
+
+    Keys combine the function name, the dataset version and a content hash of the
+    arguments. Cached values are shared between sessions and must not be mutated.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key: str, compute: callable):
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            self.misses += 1
+
+        value = compute()
+
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self)->None:
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self)->dict[str, int]:
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries
+            }
+
+result_cache = ResultCache()
+
+def cached_result(function: callable)->callable:
+    """Serve `function` from `result_cache`, keyed on its arguments and the dataset version."""
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        key = stable_hash(function.__qualname__, dataset_version(), args, sorted(kwargs.items()))
+        return result_cache.get_or_compute(key, lambda: function(*args, **kwargs))
+    return wrapper
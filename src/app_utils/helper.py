@@ -1,54 +1,160 @@
+from __future__ import annotations
 import streamlit as st
 from src.core import config
 import polars as pl
-import plotly.express as px
-import plotly.graph_objects as go
-import json
-from shapely.geometry.polygon import Polygon
+from shapely.geometry.base import BaseGeometry
+from shapely.geometry import mapping
+from typing import TYPE_CHECKING
+import numpy as np
+import shapely
+from src.dvf_processing.price_cube import filter_cube, aggregate_cube, rollup_cube, smooth_cube
+from src.dvf_processing.section_comparison import compare_sections
+from src.dvf_processing.section_index import SectionIndex
+from src.app_utils.cache import cached_result, result_cache, dataset_version
+from src.cadastres.adjacency_graph import AdjacencyGraph
+from src.cadastres.level_of_detail import get_lod_zoom, load_lod_geometries
+from src.shared_store import ArtifactBundle, current_version, read_bundle
+
+# plotly (and the DVF loaders behind the local fallback) are imported on first use,
+# they account for a large share of the app's import time
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
 
 METRIC_MAPPER = {
-        "Prix moyen": lambda x: pl.mean(x),
-        "Prix médian": lambda x: pl.median(x)
+        "Prix moyen": "prix_moyen_m2",
+        "Prix médian": "prix_median_m2"
     }
 
 def centered_subheader(text):
     st.markdown(f"<h3 style='text-align: center;'>{text}</h3>", unsafe_allow_html=True)
 
-@st.cache_data
-def load_data():
-    return pl.read_csv(config.data_dir / "cleaned" / "data_nice_cleaned.csv", try_parse_dates=True)
+def read_local_bundle(version: str)->ArtifactBundle:
+    """Bundle built from the local build outputs, when no version is published."""
+    from src.dvf_processing.clean_data import read_cleaned_data
+    from src.dvf_processing.price_cube import build_price_cube, read_price_cube
+    from src.cadastres.geometry_store import load_section_geometries
+    from src.cadastres.adjacency_graph import load_adjacency_graph
+
+    df = read_cleaned_data()
+    cube = read_price_cube()
+    return ArtifactBundle(
+        version=version,
+        data=df,
+        price_cube=cube if cube is not None else build_price_cube(df),
+        geometries=load_section_geometries(),
+        adjacency=load_adjacency_graph()
+    )
+
+# Published artifacts are memory-mapped and shared by every app process through the
+# page cache. The bundle is cached as a resource (no per-session copy) keyed on the
+# version, so it is loaded once and a new version is picked up without a restart.
+@st.cache_resource(max_entries=1)
+def load_bundle_version(version: str)->ArtifactBundle:
+    if version.startswith("local-"):
+        return read_local_bundle(version)
+    return read_bundle(version)
+
+def load_bundle()->ArtifactBundle:
+    return load_bundle_version(current_version() or f"local-{dataset_version()}")
+
+def load_data()->pl.DataFrame:
+    return load_bundle().data
+
+@st.cache_resource(max_entries=1)
+def load_section_index_version(version: str)->SectionIndex:
+    return SectionIndex.from_frame(load_bundle_version(version).data)
+
+def load_section_index()->SectionIndex:
+    """Cleaned data clustered by section, built once per dataset version."""
+    return load_section_index_version(load_bundle().version)
+
+def load_price_cube()->pl.DataFrame:
+    return load_bundle().price_cube
+
+def load_cadastre_data()->dict[str, BaseGeometry]:
+    return load_bundle().geometries
+
+def load_adjacency_data()->AdjacencyGraph:
+    return load_bundle().adjacency
 
-@st.cache_data
-def load_cadastre_data()->dict[str, list]:
-    with open(config.data_dir / "cadastre" / "code-coords.json", "r") as f:
-        polygon_data = json.load(f)
-        polygon_data = {k: Polygon(v) for k, v in polygon_data.items()}
-    return polygon_data
+@st.cache_resource(max_entries=1)
+def load_lod_data_version(version: str)->dict[int, dict[str, BaseGeometry]]:
+    return load_lod_geometries(load_cadastre_data())
+
+def load_lod_data()->dict[int, dict[str, BaseGeometry]]:
+    """Simplified geometries matching the loaded sections, reloaded with the data or the levels."""
+    return load_lod_data_version(f"{load_bundle().version}-{dataset_version()}")
+
+def select_level_of_detail(
+        polygon_data: dict[str, BaseGeometry],
+        zoom: float
+)->dict[str, BaseGeometry]:
+    """Swap each section for its simplified geometry at the level matching `zoom`, if precomputed."""
+    level = load_lod_data().get(get_lod_zoom(zoom))
+    if level is None:
+        return polygon_data
+    return {
+        name: level[name] if name in level and not level[name].is_empty else polygon
+        for name, polygon in polygon_data.items()
+    }
+
+def get_exterior_coords(geometry: BaseGeometry)->tuple[list, list]:
+    """Exterior ring coordinates of each part, separated by None so plotly draws them apart."""
+    parts = geometry.geoms if hasattr(geometry, "geoms") else [geometry]
+    x_coords, y_coords = [], []
+    for part in parts:
+        x_part, y_part = part.exterior.coords.xy
+        x_coords += [*x_part, None]
+        y_coords += [*y_part, None]
+    return x_coords[:-1], y_coords[:-1]
 
 def filter_data(
-        df: pl.DataFrame,
+        df: pl.DataFrame | SectionIndex,
         housing_type: list[str],
         section: list[str]
 )-> pl.DataFrame:
+    """With a SectionIndex, sections are sliced out of the index instead of scanned."""
+    if isinstance(df, SectionIndex):
+        df = df.rows(section)
+    else:
+        df = df.filter(pl.col('section').is_in(section))
     return df.filter(
-        pl.col('section').is_in(section),
         pl.col('type_local').is_in(housing_type),
         pl.col('prix_m2') > 500 # remove absurd prices
     )
 
-
-def calculate_stats(
+def format_transactions(
         df: pl.DataFrame,
-        granularity: list[str] = ['year', 'surface_category']
+        surface_selection: str,
+        year_range: list[int]
 )-> pl.DataFrame:
+    """Transactions of one surface range and year range, as shown in the details table."""
     return (
         df
-        .group_by(granularity)
-        .agg(
-            pl.mean('prix_m2').alias('prix_moyen_m2'),
-            pl.median('prix_m2').alias('prix_median_m2'),
-            pl.len().alias('nb_transactions')
+        .filter(
+            pl.col('surface_category') == surface_selection,
+            pl.col('year').is_between(year_range[0], year_range[1])
+        )
+        .with_columns(
+            pl.col('date_mutation').cast(str)
+        )
+        .with_columns(pl.col('prix_m2').round(0))
+        .sort("section", 'year', "prix_m2", descending=[False, True, True])
+        .select(
+            "section", "date_mutation", "prix_m2", "surface_reelle_bati", "valeur_fonciere","parcelle",
+            "type_local", "nombre_pieces_principales", "voie"
         )
+    )
+
+
+@cached_result
+def calculate_stats(
+        cube: pl.DataFrame,
+        granularity: list[str] = ['year', 'surface_category']
+)-> pl.DataFrame:
+    return (
+        cube
+        .pipe(aggregate_cube, granularity)
         .sort('surface_category', 'year')
         .with_columns([
             pl.col(col).pct_change().over('surface_category').alias(f"{col}_pct_change").fill_null(0)
@@ -61,6 +167,8 @@ def plot_evolution(
         metric: str,
         color_col: str
 )->go.Figure:
+    import plotly.express as px
+
     fig = px.line(
         stats,
         x="year", 
@@ -78,39 +186,58 @@ def plot_evolution(
     )
     return fig
 
+def plot_section_comparison(stats_section: pl.DataFrame)->go.Figure:
+    import plotly.express as px
+
+    fig = px.bar(stats_section, 
+                 x='price_type', 
+                 y='price',
+                 color='section_type',
+                 barmode='group',
+                 text='price',
+                 title='Mean and Median Prices by Section Type')
+    fig.update_traces(textposition='outside', 
+                      texttemplate='<b>€%{text}</b>')
+    return fig
+
 def average_price_per_neighborhood(
-        df: pl.DataFrame,
-        adjacing_sections_df: pl.DataFrame
+        cube: pl.DataFrame,
+        adjacing_sections: AdjacencyGraph,
+        k: int = 1,
+        decay: float = 1.0
 )->pl.DataFrame:
-    return (
-        df
-        .join(adjacing_sections_df, on = "section")
-        .explode(columns="adjacing_sections")
-        .drop('section')
-        .rename({"adjacing_sections": "section"})
-    )
+    return smooth_cube(cube, adjacing_sections, k, decay)
 
+@cached_result
 def calculate_price_per_zone(
-        df: pl.DataFrame,
+        cube: pl.DataFrame,
         surface_selection: list[str],
         year_range: list[int],
         metric: str,
-        granularity: list[str]
+        granularity: list[str],
+        adjacing_sections: AdjacencyGraph = None,
+        k: int = 1,
+        decay: float = 1.0
 )->pl.DataFrame:
-    return (
-        df
-        .filter(
-            pl.col("surface_category").is_in(surface_selection),
-            pl.col('year').is_between(year_range[0], year_range[1]),
-            pl.col('prix_m2') > 500 # remove absurd prices
+    """Price per `granularity`, smoothed over the k-hop neighbourhood when `adjacing_sections` is given."""
+    cube = cube.pipe(filter_cube, surface_selection=surface_selection, year_range=year_range)
+    if adjacing_sections is not None:
+        cube = (
+            cube
+            .pipe(rollup_cube, granularity, compress=False)
+            .pipe(average_price_per_neighborhood, adjacing_sections, k, decay)
         )
-        .group_by(granularity)
-        .agg(
-            METRIC_MAPPER[metric]('prix_m2').round(2).cast(int),
-            pl.len()
+    return (
+        cube
+        .pipe(aggregate_cube, granularity)
+        .select(
+            *granularity,
+            pl.col(METRIC_MAPPER[metric]).round(2).cast(int).alias('prix_m2'),
+            pl.col('nb_transactions').alias('len')
         )
     )
 
+@cached_result
 def calculate_price_growth(
         df: pl.DataFrame,
         year_range: list[int],
@@ -131,17 +258,89 @@ def calculate_price_growth(
         .drop_nulls()
     )
 
+colorbar_layout = dict(
+    title="Housing Price (€)",
+    thickness=15,  # Thinner colorbar
+    len=0.7,       # Shorter colorbar
+    x=1.02,        # Position to the right
+    tickformat=".0f",  # No decimals
+    tickprefix="€"     # Euro symbol
+)
+
+def section_choropleth(
+        housing_metric: dict[str, float|int],
+        polygon_data: dict[str, BaseGeometry],
+        color_choice: str,
+        min_price: float,
+        max_price: float,
+        show_colorbar: bool
+)->go.Choroplethmap:
+    """All sections as one trace backed by a GeoJSON FeatureCollection, colored client-side."""
+    import plotly.graph_objects as go
+
+    names = list(polygon_data.keys())
+    geojson = {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "id": name, "geometry": mapping(polygon)}
+            for name, polygon in polygon_data.items()
+        ]
+    }
+    return go.Choroplethmap(
+        geojson=geojson,
+        locations=names,
+        z=[housing_metric[name] for name in names],
+        featureidkey="id",
+        colorscale=color_choice,
+        # a single value gets the top color, as in the per-section rendering
+        zmin=min_price if max_price != min_price else max_price - 1,
+        zmax=max_price,
+        marker=dict(opacity=0.8, line=dict(width=1, color='white')),
+        hovertemplate="<b>%{location}</b><br>Price: €%{z:,}<extra></extra>",
+        showscale=show_colorbar,
+        colorbar=colorbar_layout
+    )
+
+def section_labels(polygon_data: dict[str, BaseGeometry])->go.Scattermap:
+    """Every section name in one text trace placed at the centroids."""
+    import plotly.graph_objects as go
+
+    centroids = shapely.centroid(np.array(list(polygon_data.values()), dtype=object))
+    return go.Scattermap(
+        lon=shapely.get_x(centroids),
+        lat=shapely.get_y(centroids),
+        mode='text',
+        text=list(polygon_data.keys()),
+        textposition="middle center",
+        textfont=dict(
+            size=12,
+            weight="bold",
+            color='black'
+        ),
+        showlegend=False,
+        hoverinfo='skip'
+    )
+
+@cached_result
 def plot_map(
         housing_metric: dict[str, float|int],
-        polygon_data: dict[str, Polygon],
+        polygon_data: dict[str, BaseGeometry],
         lon: float = 7.2620,
         lat: float = 43.7102,
         height: int = 600,
         width: int = None,
         display_section_name: bool = False,
         zoom: int = 12,
-        show_colorbar: bool = True
+        show_colorbar: bool = True,
+        level_of_detail: bool = True,
+        single_trace: bool = True
 )->go.Figure:
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    if level_of_detail:
+        polygon_data = select_level_of_detail(polygon_data, zoom)
+
     price_values = list(housing_metric.values())
     min_price = min(price_values)
     max_price = max(price_values)
@@ -151,72 +350,70 @@ def plot_map(
     # Create the map
     fig = go.Figure()
 
-    # Add each polygon with color based on price
-    for name, polygon in polygon_data.items():
-        # Extract coordinates
-        x_coords, y_coords = polygon.exterior.coords.xy
+    if single_trace:
+        fig.add_trace(section_choropleth(housing_metric, polygon_data, color_choice, min_price, max_price, show_colorbar))
+        if display_section_name:
+            fig.add_trace(section_labels(polygon_data))
+    else:
+        # Add each polygon with color based on price
+        for name, polygon in polygon_data.items():
+            # Extract coordinates
+            x_coords, y_coords = get_exterior_coords(polygon)
         
-        # Normalize price to 0-1 scale for color mapping
-        price = housing_metric[name]
-        normalized_price = (price - min_price) / (max_price - min_price) if (max_price - min_price) != 0 else 2
+            # Normalize price to 0-1 scale for color mapping
+            price = housing_metric[name]
+            normalized_price = (price - min_price) / (max_price - min_price) if (max_price - min_price) != 0 else 2
         
-        # Create color (using Viridis colorscale)
-        color = px.colors.sample_colorscale(color_choice, normalized_price)[0]
+            # Create color (using Viridis colorscale)
+            color = px.colors.sample_colorscale(color_choice, normalized_price)[0]
         
-        # Add polygon
-        fig.add_trace(go.Scattermap(
-            lon=list(x_coords),
-            lat=list(y_coords),
-            mode='lines',
-            fill='toself',
-            name=f"{name}",  # Clean name only
-            line=dict(width=1, color='white'),
-            fillcolor=color,
-            opacity=0.8,
-            hovertemplate=f"<b>{name}</b><br>Price: €{price:,}<extra></extra>",
-            showlegend=False  # Hide individual traces from legend
-        ))
+            # Add polygon
+            fig.add_trace(go.Scattermap(
+                lon=x_coords,
+                lat=y_coords,
+                mode='lines',
+                fill='toself',
+                name=f"{name}",  # Clean name only
+                line=dict(width=1, color='white'),
+                fillcolor=color,
+                opacity=0.8,
+                hovertemplate=f"<b>{name}</b><br>Price: €{price:,}<extra></extra>",
+                showlegend=False  # Hide individual traces from legend
+            ))
 
-        if display_section_name:
-            centroid = polygon.centroid
+            if display_section_name:
+                centroid = polygon.centroid
+                fig.add_trace(go.Scattermap(
+                    lon=[centroid.x],
+                    lat=[centroid.y],
+                    mode='text',
+                    text=[name],
+                    textposition="middle center",
+                    textfont=dict(
+                        size=12,
+                        weight="bold",
+                        color='black'  # Try bright color to see if it appears
+                    ),
+                    showlegend=False,
+                    hoverinfo='skip'
+                ))
+
+        if show_colorbar:
             fig.add_trace(go.Scattermap(
-                lon=[centroid.x],
-                lat=[centroid.y],
-                mode='text',
-                text=[name],
-                textposition="middle center",
-                textfont=dict(
-                    size=12,
-                    weight="bold",
-                    color='black'  # Try bright color to see if it appears
+                lon=[lon],  # Nice center
+                lat=[lat],
+                mode='markers',
+                marker=dict(
+                    size=0,  # Invisible marker
+                    colorscale=color_choice,
+                    cmin=min_price,
+                    cmax=max_price,
+                    colorbar=colorbar_layout
                 ),
                 showlegend=False,
                 hoverinfo='skip'
             ))
 
-    if show_colorbar:
-        fig.add_trace(go.Scattermap(
-            lon=[lon],  # Nice center
-            lat=[lat],
-            mode='markers',
-            marker=dict(
-                size=0,  # Invisible marker
-                colorscale=color_choice,
-                cmin=min_price,
-                cmax=max_price,
-                colorbar=dict(
-                    title="Housing Price (€)",
-                    thickness=15,  # Thinner colorbar
-                    len=0.7,       # Shorter colorbar
-                    x=1.02,        # Position to the right
-                    tickformat=".0f",  # No decimals
-                    tickprefix="€"     # Euro symbol
-                )
-            ),
-            showlegend=False,
-            hoverinfo='skip'
-        ))
-
     # Configure the map with proper controls
     fig.update_layout(
         map=dict(
@@ -234,47 +431,23 @@ def plot_map(
     )
     return fig
 
+@cached_result
 def map_calculate_stats_sections(
-        df: pl.DataFrame,
-        adjacing_sections: dict[str, list],
+        cube: pl.DataFrame,
+        adjacing_sections: AdjacencyGraph | dict[str, list],
         year_range: list[int],
         surface_selection: list[str],
-        section_choice: list[str],
+        section_choice: str,
 )->pl.DataFrame:
-    adjacing_sections_filtered = [c for c in adjacing_sections[section_choice] if c != section_choice]
-    df_filtered = (
-        df
-        .filter(
-            pl.col("surface_category").is_in(surface_selection),
-            pl.col('year').is_between(year_range[0], year_range[1]),
-            pl.col('prix_m2') > 500 # remove absurd prices
-        )
-        .with_columns(
-            pl
-            .when(pl.col('section') == section_choice).then(pl.lit("choosen_section"))
-            .when(pl.col('section').is_in(adjacing_sections_filtered)).then(pl.lit('adjacing_section'))
-            .otherwise(pl.lit('other_section'))
-            .alias('section_type')
-        )
-    )
-    df_all = pl.concat([
-        df_filtered.with_columns(pl.lit('other_section').alias('section_type')),
-        df_filtered.filter(pl.col('section_type').is_in(["choosen_section", "adjacing_section"]))
-    ])
-
-    stats = (
-        df_all
-        .group_by('section_type')
-        .agg(
-            mean_price_m2 = pl.median('prix_m2').round(0).cast(int),
-            median_price_m2 = pl.mean('prix_m2').round(0).cast(int),
-            len = pl.len()
-        )
-    )
-
     return (
-        stats
-        .drop('len')
+        cube
+        .pipe(filter_cube, surface_selection=surface_selection, year_range=year_range)
+        .pipe(compare_sections, section_choice, adjacing_sections)
+        .select(
+            'section_type',
+            pl.col('mean_price_m2').round(0).cast(int),
+            pl.col('median_price_m2').round(0).cast(int)
+        )
         .unpivot(
             index = ["section_type"],
             variable_name='price_type',
@@ -283,48 +456,24 @@ def map_calculate_stats_sections(
         .sort('section_type', "price_type")
     )
 
+@cached_result
 def map_calculate_evolution(
-        df: pl.DataFrame,
+        cube: pl.DataFrame,
         section_choice: str,
-        adjacing_sections: dict[str, list],
+        adjacing_sections: AdjacencyGraph | dict[str, list],
         surface_selection: list[str]
 )->pl.DataFrame:
-        adjacing_sections_filtered = [c for c in adjacing_sections[section_choice] if c != section_choice]
-
-        df_filtered = (
-                df
-                .filter(
-                        pl.col("surface_category").is_in(surface_selection),
-                        pl.col('prix_m2') > 500 # remove absurd prices
-                )
+        return (
+                cube
+                .pipe(filter_cube, surface_selection=surface_selection)
+                .pipe(compare_sections, section_choice, adjacing_sections, by_year=True)
                 .with_columns(
-                        pl
-                        .when(pl.col('section') == section_choice).then(pl.lit("choosen_section"))
-                        .when(pl.col('section').is_in(adjacing_sections_filtered)).then(pl.lit('adjacing_section'))
-                        .otherwise(pl.lit('other_section'))
-                        .alias('section_type')
-                        )
-        )
-
-        evolution_sections = pl.concat([
-                df_filtered.with_columns(pl.lit('other_section').alias('section_type')),
-                df_filtered.filter(pl.col('section_type').is_in(["choosen_section", "adjacing_section"]))
-        ])
-
-        evolution_sections = (
-                evolution_sections
-                .group_by("year", 'section_type')
-                .agg(
-                mean_price_m2 = pl.mean('prix_m2').round(0).cast(int),
-                median_price_m2 = pl.median('prix_m2').round(0).cast(int),
-                nb_transactions = pl.len()
+                        pl.col('mean_price_m2').round(0).cast(int),
+                        pl.col('median_price_m2').round(0).cast(int)
                 )
                 .sort('section_type', 'year')
                 .with_columns([
                 pl.col(col).pct_change().over('section_type').alias(f"{col}_pct_change").fill_null(0)
                 for col in ["mean_price_m2", "median_price_m2"]
                 ])
-                .sort('section_type', 'year')
         )
-
-        return evolution_sections
\ No newline at end of file
@@ -0,0 +1,64 @@
+from src.core import config
+from logzero import logger
+import subprocess
+import json
+import sys
+
+# first page load budget: helper import and artifact bundle load, in a fresh interpreter
+cold_start_target = 2.0
+
+startup_steps = {
+    "import_streamlit": "import streamlit",
+    "import_helper": "import src.app_utils.helper as helper",
+    "load_bundle": "bundle = helper.load_bundle()",
+    "import_plotly": "import plotly.express, plotly.graph_objects"
+}
+
+measure_script = """
+import json, time, logging
+logging.disable(logging.WARNING)
+timings = {{}}
+for step, statement in {steps!r}.items():
+    start = time.perf_counter()
+    exec(statement)
+    timings[step] = time.perf_counter() - start
+print(json.dumps(timings))
+"""
+
+def measure_cold_start()->dict[str, float]:
+    """Seconds spent in each startup step, measured in a new process so no module is already imported."""
+    output = subprocess.run(
+        [sys.executable, "-c", measure_script.format(steps=startup_steps)],
+        cwd=config.root,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def startup_report(
+        n_runs: int = 3,
+        target: float = cold_start_target
+)->dict:
+    """Best of `n_runs` cold starts per step, and whether the first page load meets `target`.
+
+    plotly is reported separately: it is only imported once a chart is drawn.
+    """
+    runs = [measure_cold_start() for _ in range(n_runs)]
+    timings = {step: min(run[step] for run in runs) for step in startup_steps}
+    first_page_load = timings["import_streamlit"] + timings["import_helper"] + timings["load_bundle"]
+    report = {
+        "timings": timings,
+        "first_page_load": first_page_load,
+        "target": target,
+        "within_target": first_page_load <= target
+    }
+    for step, seconds in timings.items():
+        logger.info(f"{step:<18} {seconds:7.3f}s")
+    logger.info(f"first page load {first_page_load:.3f}s (target {target:.1f}s)")
+    if not report["within_target"]:
+        logger.warning("Cold start is over target")
+    return report
+
+if __name__ == "__main__":
+    startup_report()
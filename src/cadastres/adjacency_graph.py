@@ -0,0 +1,135 @@
+from src.core import config
+from src.utils import save_json, load_json
+from pathlib import Path
+import numpy as np
+
+adjacency_graph_dir = config.data_dir / "cadastre" / "adjacency-graph"
+
+class AdjacencyGraph:
+    """Section adjacency stored as CSR arrays.
+
+    The neighbours of section `names[i]` are `names[j]` for `j` in
+    `indices[indptr[i]:indptr[i + 1]]`, in the order of `adjency_cadastre.json`
+    (a section is its own neighbour).
+    """
+
+    def __init__(self, names: list[str], indptr: np.ndarray, indices: np.ndarray):
+        self.names = names
+        self.indptr = indptr
+        self.indices = indices
+        self.index = {name: i for i, name in enumerate(names)}
+        self._names_array = np.array(names, dtype=object)
+
+    @classmethod
+    def from_dict(cls, adjacency: dict[str, list[str]])->"AdjacencyGraph":
+        names = list(adjacency.keys())
+        index = {name: i for i, name in enumerate(names)}
+        indptr = np.zeros(len(names) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(neighbours) for neighbours in adjacency.values()])
+        indices = np.fromiter(
+            (index[neighbour] for neighbours in adjacency.values() for neighbour in neighbours),
+            dtype=np.int32,
+            count=indptr[-1]
+        )
+        return cls(names, indptr, indices)
+
+    @classmethod
+    def from_pairs(cls, names: list[str], pairs: np.ndarray)->"AdjacencyGraph":
+        """Build the graph from (section, neighbour) index pairs, neighbours sorted by index."""
+        left, right = pairs[:, np.lexsort((pairs[1], pairs[0]))]
+        indptr = np.searchsorted(left, np.arange(len(names) + 1), side="left").astype(np.int64)
+        return cls(names, indptr, right.astype(np.int32))
+
+    def to_dict(self)->dict[str, list[str]]:
+        return {name: self[name] for name in self.names}
+
+    def save(self, graph_dir: Path = adjacency_graph_dir)->Path:
+        graph_dir.mkdir(parents=True, exist_ok=True)
+        np.save(graph_dir / "indptr.npy", self.indptr)
+        np.save(graph_dir / "indices.npy", self.indices)
+        save_json(graph_dir / "names.json", self.names)
+        return graph_dir
+
+    @classmethod
+    def load(cls, graph_dir: Path = adjacency_graph_dir)->"AdjacencyGraph":
+        return cls(
+            load_json(graph_dir / "names.json"),
+            np.load(graph_dir / "indptr.npy", mmap_mode="r"),
+            np.load(graph_dir / "indices.npy", mmap_mode="r")
+        )
+
+    def __len__(self)->int:
+        return len(self.names)
+
+    def __contains__(self, section: str)->bool:
+        return section in self.index
+
+    def __getitem__(self, section: str)->list[str]:
+        return self.neighbours(section)
+
+    def neighbour_indices(self, i: int)->np.ndarray:
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def neighbours(self, section: str)->list[str]:
+        """1-hop neighbourhood, the section included."""
+        return self._names_array[self.neighbour_indices(self.index[section])].tolist()
+
+    def pairs(self, rows: np.ndarray)->np.ndarray:
+        """(row, neighbour) index pairs of the given rows, gathered without a Python loop."""
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return np.stack([np.repeat(rows, lengths), self.indices[np.arange(lengths.sum()) + offsets]])
+
+    def expand(self, frontier: np.ndarray)->np.ndarray:
+        """Indices of all neighbours of the `frontier` indices."""
+        return np.unique(self.pairs(frontier)[1])
+
+    def k_hop_pairs(self, k: int = 1)->tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(section, neighbour, hops) index triplets for every section, in COO form.
+
+        Each section is paired with itself at 0 hops and with every section at most
+        `k` hops away, at its shortest hop distance.
+        """
+        n = len(self.names)
+        rows = np.arange(n, dtype=np.int64)
+        cols = rows.copy()
+        hops = np.zeros(n, dtype=np.int64)
+        seen = rows * n + cols
+        frontier_rows, frontier_cols = rows, cols
+        for hop in range(1, k + 1):
+            expanded = self.pairs(frontier_cols)
+            candidate_rows = np.repeat(frontier_rows, np.diff(self.indptr)[frontier_cols])
+            keys = np.unique(candidate_rows * n + expanded[1])
+            keys = keys[~np.isin(keys, seen)]
+            if len(keys) == 0:
+                break
+            frontier_rows, frontier_cols = keys // n, keys % n
+            rows = np.concatenate([rows, frontier_rows])
+            cols = np.concatenate([cols, frontier_cols])
+            hops = np.concatenate([hops, np.full(len(keys), hop)])
+            seen = np.union1d(seen, keys)
+        return rows, cols, hops
+
+    def k_hop_indices(self, sections: list[str] | str, k: int = 1)->np.ndarray:
+        if isinstance(sections, str):
+            sections = [sections]
+        visited = np.array([self.index[section] for section in sections], dtype=np.int64)
+        frontier = visited
+        for _ in range(k):
+            reached = self.expand(frontier)
+            frontier = np.setdiff1d(reached, visited, assume_unique=True)
+            if len(frontier) == 0:
+                break
+            visited = np.union1d(visited, frontier)
+        return visited
+
+    def k_hop(self, sections: list[str] | str, k: int = 1)->list[str]:
+        """Sections at most `k` hops away from any of `sections`, sorted by index."""
+        return self._names_array[self.k_hop_indices(sections, k)].tolist()
+
+def load_adjacency_graph()->AdjacencyGraph:
+    """The CSR artifact, or the graph built from the legacy adjency_cadastre.json."""
+    if (adjacency_graph_dir / "indptr.npy").exists():
+        return AdjacencyGraph.load()
+    return AdjacencyGraph.from_dict(load_json(config.data_dir / "cadastre" / "adjency_cadastre.json"))
@@ -1,26 +1,76 @@
 from src.core import config
+from src.cadastres.geometry_store import save_geometry_store, geometry_store_dir
+from shapely.geometry import shape
 from tqdm import tqdm
+from pathlib import Path
+from typing import Iterator
+import gzip
+import ijson
 import json
 
-def load_lines()->list[str]:
+def get_sections_file_path()->Path:
+    """The national sections file, compressed if available."""
     file_path = config.data_dir / "cadastre" / "cadastre-france-sections.json"
-    lines = []
-
-    with open(file_path, 'r', encoding='utf-8') as f:
-        for line in tqdm(f):
-            lines.append(line)
-    
-    return lines
-
-def convert_lines_to_json(lines: list)-> list[dict]:
-    return [json.loads(line[:-2]) for line in tqdm(lines[1:])]
-
-def create_json_list_polygons()->dict[str, list]:
-    lines = load_lines()
-    lines_json = convert_lines_to_json(lines)
-    lines_nice = [c for c in tqdm(lines_json) if c["properties"]["commune"] == "06088"]
-    code_coords = {line["properties"]["code"]: line["geometry"]["coordinates"][0][0] for line in lines_nice}
+    gz_file_path = file_path.with_name(file_path.name + ".gz")
+    return gz_file_path if gz_file_path.exists() else file_path
+
+def iter_sections(
+        file_path: Path = None,
+        communes: tuple[str, ...] | None = ("06088",),
+        departments: tuple[str, ...] | None = None
+)->Iterator[dict]:
+    """Stream the section features of the given communes and departments (None meaning all).
+
+    Features are parsed one at a time with ijson, directly from the .gz file if needed,
+    so memory does not depend on the size of the national file.
+    """
+    file_path = file_path or get_sections_file_path()
+    opener = gzip.open if file_path.suffix == ".gz" else open
+    departments = tuple(departments) if departments is not None else None
+
+    with opener(file_path, "rb") as f:
+        for feature in tqdm(ijson.items(f, "features.item", use_float=True)):
+            commune = feature["properties"]["commune"]
+            if communes is not None and commune not in communes:
+                continue
+            if departments is not None and not commune.startswith(departments):
+                continue
+            yield feature
+
+def create_json_list_polygons(
+        communes: tuple[str, ...] | None = ("06088",),
+        departments: tuple[str, ...] | None = None,
+        key: str = "code"
+)->dict[str, list]:
+    """Extract the outer ring of each section.
+
+    Sections are keyed by their `code`, which is only unique within a commune:
+    use `key="id"` when extracting several communes.
+    """
+    code_coords = {
+        feature["properties"][key]: feature["geometry"]["coordinates"][0][0]
+        for feature in iter_sections(communes=communes, departments=departments)
+    }
     save_json_code_coords(code_coords)
+    return code_coords
+
+def create_geometry_store(
+        communes: tuple[str, ...] | None = ("06088",),
+        departments: tuple[str, ...] | None = None,
+        key: str = "code",
+        file_path: Path = None,
+        store_dir: Path = geometry_store_dir
+)->Path:
+    """Extract the full geometry of each section, every part included, into the binary store.
+
+    A new cadastre vintage can be extracted from its own `file_path` into another
+    `store_dir`, to be diffed against the current store.
+    """
+    geometries = {
+        feature["properties"][key]: shape(feature["geometry"])
+        for feature in iter_sections(file_path, communes=communes, departments=departments)
+    }
+    return save_geometry_store(geometries, store_dir)
 
 def save_json_code_coords(json_input: dict)->None:
     file_path = config.data_dir / "cadastre" / "code-coords.json"
@@ -28,5 +78,4 @@ def save_json_code_coords(json_input: dict)->None:
         json.dump(json_input, f)
 
 if __name__=="__main__":
-    create_json_list_polygons()
-
+    create_geometry_store()
@@ -0,0 +1,71 @@
+from src.core import config
+from src.utils import save_json, load_json
+from pathlib import Path
+from shapely.geometry.base import BaseGeometry
+from shapely.geometry.polygon import Polygon
+import hashlib
+import numpy as np
+import shapely
+
+geometry_store_dir = config.data_dir / "cadastre" / "sections-store"
+
+def hash_geometries(geometries: np.ndarray)->list[str]:
+    """Content hash of each geometry, used to diff two cadastre vintages."""
+    return [hashlib.sha1(wkb).hexdigest() for wkb in shapely.to_wkb(geometries)]
+
+def save_geometry_store(
+        geometries: dict[str, BaseGeometry],
+        store_dir: Path = geometry_store_dir,
+        extra_metadata: dict = None
+)->Path:
+    """Store geometries as flat coordinate and offset arrays (shapely ragged array layout).
+
+    Polygons and multi-polygons are stored together as multi-polygons, holes included.
+    `extra_metadata` is saved along with the keys and hashes.
+    """
+    store_dir.mkdir(parents=True, exist_ok=True)
+    geometry_array = np.array(list(geometries.values()), dtype=object)
+    geometry_type, coords, offsets = shapely.to_ragged_array(geometry_array)
+    np.save(store_dir / "coords.npy", coords)
+    for i, offset in enumerate(offsets):
+        np.save(store_dir / f"offsets_{i}.npy", offset)
+    save_json(
+        store_dir / "metadata.json",
+        {
+            "keys": list(geometries.keys()),
+            "geometry_type": int(geometry_type),
+            "nb_offsets": len(offsets),
+            "hashes": hash_geometries(geometry_array),
+            **(extra_metadata or {})
+        }
+    )
+    return store_dir
+
+def load_geometry_array(store_dir: Path = geometry_store_dir)->tuple[list[str], np.ndarray]:
+    """Memory-map the store and rebuild every geometry with one vectorized call."""
+    metadata = load_json(store_dir / "metadata.json")
+    coords = np.load(store_dir / "coords.npy", mmap_mode="r")
+    offsets = tuple(
+        np.load(store_dir / f"offsets_{i}.npy", mmap_mode="r")
+        for i in range(metadata["nb_offsets"])
+    )
+    geometries = shapely.from_ragged_array(shapely.GeometryType(metadata["geometry_type"]), coords, offsets)
+    return metadata["keys"], geometries
+
+def load_geometry_hashes(store_dir: Path = geometry_store_dir)->dict[str, str]:
+    metadata = load_json(store_dir / "metadata.json")
+    if "hashes" in metadata:
+        return dict(zip(metadata["keys"], metadata["hashes"]))
+    keys, geometries = load_geometry_array(store_dir)
+    return dict(zip(keys, hash_geometries(geometries)))
+
+def load_geometry_store(store_dir: Path = geometry_store_dir)->dict[str, BaseGeometry]:
+    keys, geometries = load_geometry_array(store_dir)
+    return dict(zip(keys, geometries))
+
+def load_section_geometries()->dict[str, BaseGeometry]:
+    """Section geometries from the binary store, or from the legacy code-coords.json."""
+    if (geometry_store_dir / "metadata.json").exists():
+        return load_geometry_store()
+    polygon_data = load_json(config.data_dir / "cadastre" / "code-coords.json")
+    return {k: Polygon(v) for k, v in polygon_data.items()}
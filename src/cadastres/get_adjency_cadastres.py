@@ -1,14 +1,26 @@
 from src.core import config
-from src.utils import save_json
-import json
+from src.utils import save_json, load_json
+from logzero import logger
+from src.cadastres.geometry_store import (
+    load_section_geometries, load_geometry_array, load_geometry_hashes, hash_geometries, geometry_store_dir
+)
+from src.cadastres.cadastre_processing import create_geometry_store
+from src.cadastres.level_of_detail import create_lod_stores
+from pathlib import Path
+from src.cadastres.adjacency_graph import AdjacencyGraph, adjacency_graph_dir
 from shapely.geometry.polygon import Polygon
+from shapely import STRtree
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
+import numpy as np
+import shapely
+import argparse
+import shutil
 
-def load_cadastre_data()->dict[str, list]:
-    with open(config.data_dir / "cadastre" / "code-coords.json", "r") as f:
-        polygon_data = json.load(f)
-        polygon_data = {k: Polygon(v) for k, v in polygon_data.items()}
-    return polygon_data
+adjency_cadastre_path = config.data_dir / "cadastre" / "adjency_cadastre.json"
+
+def load_cadastre_data()->dict[str, Polygon]:
+    return load_section_geometries()
 
 
 def get_adjency_cadastre(
@@ -27,10 +39,149 @@ def get_adjency_cadastre(
         all_adjacing_cadastres[cadastre] = adjacing_cadastres
     return all_adjacing_cadastres
 
+_worker_geometries = None
+_worker_tree = None
+
+def _init_worker(geometries: np.ndarray)->None:
+    global _worker_geometries, _worker_tree
+    _worker_geometries = geometries
+    _worker_tree = STRtree(geometries)
+
+def query_adjacent_pairs(
+        geometries: np.ndarray,
+        tree: STRtree,
+        indices: np.ndarray
+)->np.ndarray:
+    """(section, adjacent section) index pairs for the sections in `indices`.
+
+    Touching or identical geometries always have intersecting bounding boxes, so the
+    exact predicates only run on the candidates returned by the tree.
+    """
+    left, right = tree.query(geometries[indices])
+    left = indices[left]
+    is_adjacent = (
+        shapely.touches(geometries[left], geometries[right])
+        | shapely.equals_identical(geometries[left], geometries[right])
+    )
+    return np.stack([left[is_adjacent], right[is_adjacent]])
+
+def _query_chunk(indices: np.ndarray)->np.ndarray:
+    return query_adjacent_pairs(_worker_geometries, _worker_tree, indices)
+
+def get_adjency_cadastre_strtree(
+        polygon_data: dict[str, Polygon],
+        n_workers: int = None,
+        chunk_size: int = 10_000
+)->dict[str, list[str]]:
+    """Same output as `get_adjency_cadastre`, using an STRtree instead of comparing every pair.
+
+    With `n_workers`, chunks of sections are queried in a process pool, each worker
+    building its own tree once.
+    """
+    names = list(polygon_data.keys())
+    geometries = np.array(list(polygon_data.values()), dtype=object)
+    indices = np.arange(len(geometries))
+
+    if n_workers:
+        chunks = [indices[i:i + chunk_size] for i in range(0, len(indices), chunk_size)]
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_init_worker,
+            initargs=(geometries,)
+        ) as executor:
+            pairs = np.concatenate(list(tqdm(executor.map(_query_chunk, chunks), total=len(chunks))), axis=1)
+    else:
+        pairs = query_adjacent_pairs(geometries, STRtree(geometries), indices)
+
+    # neighbours sorted by index keep the order of polygon_data, like the pairwise loop
+    return AdjacencyGraph.from_pairs(names, pairs).to_dict()
+
+def update_adjacency_graph(
+        old_graph: AdjacencyGraph,
+        old_store_dir: Path,
+        new_store_dir: Path
+)->AdjacencyGraph:
+    """Patch the adjacency of an old cadastre vintage for a new one.
+
+    Sections are diffed by code and geometry hash. Only the changed sections, their
+    former neighbours and the sections near their new geometry are queried again; the
+    other rows are carried over. The result equals a full recomputation on the new store.
+    """
+    old_hashes = load_geometry_hashes(old_store_dir)
+    new_names, new_geometries = load_geometry_array(new_store_dir)
+    new_geometries = np.asarray(new_geometries)
+    new_hashes = load_json(new_store_dir / "metadata.json").get("hashes") or hash_geometries(new_geometries)
+    new_index = {name: i for i, name in enumerate(new_names)}
+
+    changed = np.array(
+        [i for i, (name, geometry_hash) in enumerate(zip(new_names, new_hashes)) if old_hashes.get(name) != geometry_hash],
+        dtype=np.int64
+    )
+    removed = [name for name in old_graph.names if name not in new_index]
+    logger.info(f"{len(changed)} new or changed sections, {len(removed)} removed sections")
+
+    tree = STRtree(new_geometries)
+    # sections that touched a changed or removed section in the old vintage...
+    old_sources = [new_names[i] for i in changed if new_names[i] in old_graph] + removed
+    former_neighbours = [
+        new_index[name] for name in old_graph.k_hop(old_sources, 1) if name in new_index
+    ] if old_sources else []
+    # ...or may touch a changed section in the new one
+    _, new_candidates = tree.query(new_geometries[changed])
+    affected = np.unique(np.concatenate([changed, new_candidates, np.array(former_neighbours, dtype=np.int64)]))
+
+    recomputed_pairs = query_adjacent_pairs(new_geometries, tree, affected)
+
+    old_to_new = np.array([new_index.get(name, -1) for name in old_graph.names], dtype=np.int64)
+    unaffected = np.setdiff1d(np.arange(len(new_names)), affected)
+    kept_rows = np.array([old_graph.index[new_names[i]] for i in unaffected], dtype=np.int64)
+    kept_pairs = old_to_new[old_graph.pairs(kept_rows)]
+
+    return AdjacencyGraph.from_pairs(new_names, np.concatenate([kept_pairs, recomputed_pairs], axis=1))
+
+def save_adjacency(adjacency_graph: AdjacencyGraph, graph_dir: Path = adjacency_graph_dir)->None:
+    """Save the graph artifact and the legacy `adjency_cadastre.json`."""
+    adjacency_graph.save(graph_dir)
+    save_json(file_path=adjency_cadastre_path, json_input=adjacency_graph.to_dict())
+
+def update_stored_adjacency(
+        sections_file_path: Path,
+        store_dir: Path = geometry_store_dir,
+        graph_dir: Path = adjacency_graph_dir,
+        communes: tuple[str, ...] | None = ("06088",),
+        departments: tuple[str, ...] | None = None
+)->AdjacencyGraph:
+    """Move the stored geometries and adjacency to a new cadastre vintage.
+
+    The new sections file is extracted next to the current store, the stored graph is
+    patched with `update_adjacency_graph` and saved, then the new store replaces the old
+    one and its simplified levels of detail are rebuilt.
+    """
+    new_store_dir = store_dir.with_name(f"{store_dir.name}.new")
+    shutil.rmtree(new_store_dir, ignore_errors=True)
+    create_geometry_store(communes, departments, file_path=sections_file_path, store_dir=new_store_dir)
+
+    adjacency_graph = update_adjacency_graph(AdjacencyGraph.load(graph_dir), store_dir, new_store_dir)
+    save_adjacency(adjacency_graph, graph_dir)
+
+    old_store_dir = store_dir.with_name(f"{store_dir.name}.old")
+    shutil.rmtree(old_store_dir, ignore_errors=True)
+    store_dir.rename(old_store_dir)
+    new_store_dir.rename(store_dir)
+    shutil.rmtree(old_store_dir)
+    create_lod_stores(store_dir)
+    return adjacency_graph
+
 if __name__ == "__main__":
-    polygon_data = load_cadastre_data()
-    adjency_cadastre = get_adjency_cadastre(polygon_data)
-    save_json(
-        file_path = config.data_dir / "cadastre" / "adjency_cadastre.json",
-        json_input = adjency_cadastre
-    )
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--update",
+        type=Path,
+        help="sections file of a new cadastre vintage, to patch the stored adjacency instead of recomputing it"
+    )
+    args = parser.parse_args()
+    if args.update:
+        update_stored_adjacency(args.update)
+    else:
+        polygon_data = load_cadastre_data()
+        save_adjacency(AdjacencyGraph.from_dict(get_adjency_cadastre_strtree(polygon_data)))
@@ -0,0 +1,89 @@
+from src.core import config
+from src.cadastres.geometry_store import (
+    load_geometry_array, load_geometry_store, save_geometry_store, geometry_store_dir, hash_geometries
+)
+from src.utils import load_json
+from shapely.geometry.base import BaseGeometry
+from pathlib import Path
+import numpy as np
+import shapely
+
+lod_dir = config.data_dir / "cadastre" / "sections-lod"
+
+# map zoom levels with a precomputed simplified geometry set
+lod_zooms = [10, 12, 14, 16]
+
+def get_tolerance(zoom: float)->float:
+    """Half a pixel in degrees at this web map zoom (256 px tiles)."""
+    return 180 / (256 * 2 ** zoom)
+
+def simplify_sections(geometries: np.ndarray, zoom: float)->np.ndarray:
+    """Simplify the sections as a coverage, then snap their coordinates to a grid.
+
+    Coverage simplification simplifies each shared border once, so neighbouring
+    sections keep identical edges and no gap or overlap appears. Snapping is
+    deterministic per coordinate, so shared vertices stay shared.
+    """
+    tolerance = get_tolerance(zoom)
+    simplified = shapely.coverage_simplify(geometries, tolerance)
+    return shapely.set_precision(simplified, tolerance / 8)
+
+def create_lod_stores(store_dir: Path = geometry_store_dir)->list[Path]:
+    """Simplify the store at every level of `lod_zooms`.
+
+    Each level records the hash of the full resolution geometry it was simplified
+    from, so sections changed since (e.g. by a new cadastre vintage) can be detected.
+    """
+    keys, geometries = load_geometry_array(store_dir)
+    geometries = np.asarray(geometries)
+    source_hashes = hash_geometries(geometries)
+    return [
+        save_geometry_store(
+            dict(zip(keys, simplify_sections(geometries, zoom))),
+            lod_dir / f"zoom_{zoom}",
+            extra_metadata={"source_hashes": source_hashes}
+        )
+        for zoom in lod_zooms
+    ]
+
+def get_lod_zoom(zoom: float)->int | None:
+    """The coarsest level still precise enough for `zoom`, None for full resolution."""
+    return next((lod_zoom for lod_zoom in lod_zooms if lod_zoom >= zoom), None)
+
+def load_lod_level(
+        zoom: int,
+        geometries: dict[str, BaseGeometry] = None
+)->dict[str, BaseGeometry]:
+    """Simplified geometries of one level.
+
+    With the full resolution `geometries`, only the sections simplified from these
+    exact geometries are kept; the others are left to full resolution.
+    """
+    level_dir = lod_dir / f"zoom_{zoom}"
+    level = load_geometry_store(level_dir)
+    if geometries is None:
+        return level
+    source_hashes = dict(zip(level.keys(), load_json(level_dir / "metadata.json").get("source_hashes", [])))
+    names = [name for name in geometries if name in level]
+    current_hashes = hash_geometries(np.array([geometries[name] for name in names], dtype=object))
+    return {
+        name: level[name]
+        for name, current_hash in zip(names, current_hashes)
+        if source_hashes.get(name) == current_hash
+    }
+
+def load_lod_geometries(
+        geometries: dict[str, BaseGeometry] = None
+)->dict[int, dict[str, BaseGeometry]]:
+    """Every simplified geometry set available on disk, keyed by zoom level.
+
+    See `load_lod_level` for `geometries`.
+    """
+    return {
+        zoom: load_lod_level(zoom, geometries)
+        for zoom in lod_zooms
+        if (lod_dir / f"zoom_{zoom}" / "metadata.json").exists()
+    }
+
+if __name__ == "__main__":
+    create_lod_stores()
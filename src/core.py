@@ -11,6 +11,7 @@ class Config(BaseModel):
     """General configuration for the project."""
     root: Path = ROOT
     data_dir: Path = ROOT / "data"
+    dvf_cache_dir: Path = ROOT / "data" / "dvf-parquet"
     jinka_email: str = os.environ.get("EMAIL")
     jinka_password: str = os.environ.get("PASSWORD")
     
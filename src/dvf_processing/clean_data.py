@@ -1,6 +1,17 @@
 import polars as pl
-from src.loader import load_dvf_years
+from src.loader import (
+    scan_dvf_years, scan_dvf_for_year, compact_dvf, nature_mutation_enum, type_local_enum,
+    get_dvf_file_path, compute_fingerprint, check_fingerprint
+)
+from src.utils import save_json, load_json
+from src.dvf_processing.price_cube import write_price_cube
 from src.core import config
+from logzero import logger
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+import multiprocessing
+import shutil
 
 info_cols = [
     #"date_mutation",
@@ -20,36 +31,98 @@ agg_cols = [
 
 commune = "NICE"
 
-def pre_treatment(df: pl.DataFrame)->pl.DataFrame:
+surface_labels = ["≤25m²", "26-40m²", "41-60m²", "61-80m²", "81-120m²", ">120m²"]
+surface_category_enum = pl.Enum(surface_labels)
+
+cleaned_compact_types = {
+    "section": pl.String,
+    "nature_mutation": nature_mutation_enum,
+    "commune": pl.Categorical,
+    "type_local": type_local_enum,
+    "nombre_pieces_principales": pl.Int16,
+    "voie": pl.Categorical,
+    "surface_category": surface_category_enum,
+    "surface_reelle_bati": pl.Int32,
+    "nb_lots": pl.UInt16,
+    "year": pl.Int16
+}
+
+# grouping keys stay Strings in the cleaning plan: sections are joined with String
+# keys downstream (adjacency, cube) and sorted lexically
+cleaned_string_cols = ("code_departement", "code_commune", "section")
+
+cleaned_csv_path = config.data_dir / "cleaned" / "data_nice_cleaned.csv"
+cleaned_parquet_path = config.data_dir / "cleaned" / "data_nice_cleaned.parquet"
+cleaned_manifest_path = config.data_dir / "cleaned" / "manifest.json"
+
+# small row groups sorted by section then year let min/max statistics skip most of the file
+cleaned_sort_cols = ["section", "year", "date_mutation"]
+cleaned_row_group_size = 8_192
+
+group_cols = [
+    "code_departement",
+    "code_commune",
+    "date_mutation",
+    "parcelle",
+    "valeur_fonciere"
+]
+
+def filter_communes(
+        df: pl.DataFrame | pl.LazyFrame,
+        communes: tuple[str, ...] | None = (commune,),
+        departments: tuple[str, ...] | None = None
+)->pl.DataFrame | pl.LazyFrame:
+    """Keep the given communes and departments, None meaning all of them."""
+    if departments is not None:
+        df = df.filter(pl.col('code_departement').is_in(list(departments)))
+    if communes is not None:
+        df = df.filter(pl.col('commune').is_in(list(communes)))
+    return df
+
+parcelle = pl.concat_str("section", "no_plan")
+
+def pre_treatment(
+        df: pl.DataFrame | pl.LazyFrame,
+        communes: tuple[str, ...] | None = (commune,),
+        departments: tuple[str, ...] | None = None
+)->pl.DataFrame | pl.LazyFrame:
     return (
         df
-        .filter(pl.col('commune') == commune)
+        .pipe(filter_communes, communes, departments)
         .with_columns(
             prix_m2 = pl.col('valeur_fonciere') / pl.col('surface_reelle_bati'),
-            parcelle = pl.concat_str("section", "no_plan")
+            parcelle = parcelle
         )
     )
 
-def create_breaks(df: pl.DataFrame, surface_col: str = "surface_reelle_bati")->pl.DataFrame:
+def create_breaks(
+        df: pl.DataFrame | pl.LazyFrame,
+        surface_col: str = "surface_reelle_bati"
+)->pl.DataFrame | pl.LazyFrame:
     return (
         df.with_columns(
+            # through String: a Categorical only casts to the Enum under a shared string cache
             pl.col(surface_col).cut(
                 breaks=[25, 40, 60, 80, 120], 
-                labels=["≤25m²", "26-40m²", "41-60m²", "61-80m²", "81-120m²", ">120m²"]
-            ).alias("surface_category")
+                labels=surface_labels
+            ).cast(pl.String).cast(surface_category_enum).alias("surface_category")
         )
     )
 
-def clean_data(df: pl.DataFrame)-> pl.DataFrame:
+def clean_data(
+        df: pl.DataFrame | pl.LazyFrame,
+        communes: tuple[str, ...] | None = (commune,)
+)-> pl.DataFrame | pl.LazyFrame:
+    # sections and plan numbers are only unique within a commune
     return (
         df
+        .pipe(filter_communes, communes)
         .filter(
-            pl.col('commune') == commune,
             pl.col('type_local').is_in(["Appartement", "Maison"]),
             pl.col('nature_mutation') == "Vente",
             pl.col('nature_culture').is_null()
         )
-        .group_by("date_mutation", 'parcelle', "valeur_fonciere")
+        .group_by(group_cols)
         .agg(
             *[pl.first(col).name.keep() for col in info_cols],
             *[pl.sum(col).name.keep() for col in agg_cols],
@@ -61,7 +134,181 @@ def clean_data(df: pl.DataFrame)-> pl.DataFrame:
         )
     )
 
+def compact_cleaned_data(df: pl.DataFrame | pl.LazyFrame)-> pl.DataFrame | pl.LazyFrame:
+    """Cast the cleaned dataset to categorical and narrow numeric types."""
+    columns = df.collect_schema().names()
+    return df.cast({col: dtype for col, dtype in cleaned_compact_types.items() if col in columns})
+
+def scan_cleaned_data(
+        years: list[int] = None,
+        communes: tuple[str, ...] | None = (commune,),
+        departments: tuple[str, ...] | None = None,
+        use_cache: bool = True
+)-> pl.LazyFrame:
+    """The whole cleaning chain as a single lazy plan.
+
+    Same output as `pre_treatment` → `create_breaks` → `clean_data`, without the
+    per-lot `prix_m2` (recomputed after aggregation anyway) and without filtering
+    the communes twice. Filters come before the compact cast so they reach the scan.
+    """
+    return (
+        scan_dvf_years(years, use_cache=use_cache)
+        .pipe(filter_communes, communes, departments)
+        .pipe(compact_dvf, keep_strings=cleaned_string_cols)
+        .with_columns(parcelle = parcelle)
+        .pipe(create_breaks)
+        .pipe(clean_data, communes=None)
+        .pipe(compact_cleaned_data)
+    )
+
+def run_cleaning_plan(
+        years: list[int] = None,
+        communes: tuple[str, ...] | None = (commune,),
+        departments: tuple[str, ...] | None = None,
+        use_cache: bool = True
+)-> pl.DataFrame:
+    """Collect `scan_cleaned_data` with the streaming engine."""
+    return scan_cleaned_data(years, communes, departments, use_cache).collect(engine="streaming")
+
+def clean_years(years: list[int])-> pl.DataFrame:
+    return run_cleaning_plan(years)
+
+def get_outdated_years(years: list[int], manifest: dict)-> tuple[list[int], dict]:
+    """Years whose source file is new or changed since the manifest, and the updated manifest."""
+    outdated_years = []
+    updated_manifest = dict()
+    for year in years:
+        file_path = get_dvf_file_path(year)
+        entry = manifest.get(str(year))
+        fingerprint = None
+        if entry is not None and entry["file"] == file_path.name:
+            fingerprint = check_fingerprint(file_path, entry["fingerprint"])
+        if fingerprint is None:
+            outdated_years.append(year)
+            fingerprint = compute_fingerprint(file_path)
+        updated_manifest[str(year)] = {"file": file_path.name, "fingerprint": fingerprint}
+    return outdated_years, updated_manifest
+
+def read_cleaned_data()-> pl.DataFrame:
+    """Read the cleaned dataset, preferring the Parquet output over the CSV one."""
+    if cleaned_parquet_path.exists():
+        df = pl.read_parquet(cleaned_parquet_path)
+    else:
+        df = pl.read_csv(cleaned_csv_path, try_parse_dates=True)
+    return df.pipe(compact_cleaned_data)
+
+def write_cleaned_data(df: pl.DataFrame)-> pl.DataFrame:
+    """Write the cleaned dataset sorted by section and year, as Parquet with statistics and as CSV.
+
+    Sections are sorted as Strings: Parquet min/max statistics are lexical, a
+    Categorical would sort by its physical order and row groups would overlap.
+    """
+    df = df.with_columns(pl.col('section').cast(pl.String)).sort(cleaned_sort_cols)
+    cleaned_parquet_path.parent.mkdir(parents=True, exist_ok=True)
+    df.write_parquet(
+        cleaned_parquet_path,
+        statistics=True,
+        row_group_size=cleaned_row_group_size
+    )
+    df.write_csv(cleaned_csv_path)
+    write_price_cube(df)
+    return df
+
+def build_cleaned_data(
+        years: list[int] = None,
+        incremental: bool = True
+)-> pl.DataFrame:
+    """Clean the DVF years and write the dataset used by the app.
+
+    In incremental mode, a manifest records the fingerprint of every source file
+    that went into the output; only new or changed years are cleaned again and
+    their rows replace the previous ones. Rows are cleaned independently per year
+    since `date_mutation` is part of the grouping key.
+    """
+    years = years or list(range(2020, 2025))
+    has_output = cleaned_parquet_path.exists() or cleaned_csv_path.exists()
+
+    manifest = load_json(cleaned_manifest_path) if incremental and cleaned_manifest_path.exists() and has_output else dict()
+    outdated_years, manifest = get_outdated_years(years, manifest)
+    if not outdated_years:
+        logger.info("Cleaned data is up to date")
+        return read_cleaned_data()
+
+    logger.info(f"Cleaning years {outdated_years}")
+    # the kept and re-cleaned rows get their Categoricals (commune, voie) from
+    # separate reads, they must share a string cache to be concatenated
+    with pl.StringCache():
+        df = clean_years(outdated_years)
+        if len(outdated_years) < len(years):
+            df_kept = (
+                read_cleaned_data()
+                .filter(
+                    pl.col('year').is_in(years),
+                    ~pl.col('year').is_in(outdated_years)
+                )
+            )
+            df = pl.concat([df_kept, df.select(df_kept.columns)], how="vertical_relaxed")
+
+    df = write_cleaned_data(df)
+    save_json(cleaned_manifest_path, manifest)
+    return df
+
+def clean_department(
+        department: str,
+        years: list[int],
+        communes: tuple[str, ...] | None,
+        output_dir: Path
+)-> Path:
+    """Clean one department and write it partitioned by commune.
+
+    Runs in a worker process; only the department's partition of the Parquet cache is read.
+    """
+    df = (
+        run_cleaning_plan(years, communes, departments=(department,))
+        .drop('code_departement')
+        .with_columns(pl.col('commune').cast(pl.String))
+        .sort(["commune", *cleaned_sort_cols])
+    )
+    department_dir = output_dir / f"code_departement={department}"
+    shutil.rmtree(department_dir, ignore_errors=True)
+    department_dir.mkdir(parents=True)
+    df.write_parquet(
+        department_dir,
+        partition_by="commune",
+        statistics=True,
+        row_group_size=cleaned_row_group_size
+    )
+    logger.info(f"Department {department}: {len(df)} cleaned transactions")
+    return department_dir
+
+def build_partitioned_cleaned_data(
+        departments: list[str],
+        communes: list[str] | None = None,
+        years: list[int] = None,
+        n_workers: int = None
+)-> Path:
+    """Clean several communes (all of them when `communes` is None) in one pass.
+
+    Output is written under `data/cleaned/partitioned/code_departement=XX/commune=YY/`.
+    Departments are independent and run in a process pool of `n_workers`.
+    """
+    years = years or list(range(2020, 2025))
+    communes = tuple(communes) if communes is not None else None
+    output_dir = config.data_dir / "cleaned" / "partitioned"
+
+    # build the Parquet caches once, before workers read them concurrently
+    for year in years:
+        scan_dvf_for_year(year, build_cache=True)
+
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        list(executor.map(
+            partial(clean_department, years=years, communes=communes, output_dir=output_dir),
+            departments
+        ))
+    return output_dir
+
 if __name__== "__main__":
-    df = load_dvf_years(transform=pre_treatment).pipe(create_breaks)
-    df = df.pipe(clean_data)
-    df.write_csv(config.data_dir / "cleaned" /  "data_nice_cleaned.csv")
\ No newline at end of file
+    build_cleaned_data()
\ No newline at end of file
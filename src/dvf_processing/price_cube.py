@@ -0,0 +1,224 @@
+import polars as pl
+from src.core import config
+from src.cadastres.adjacency_graph import AdjacencyGraph
+
+price_cube_path = config.data_dir / "cleaned" / "price_cube.parquet"
+
+# finest dimensions the app filters or groups on
+cube_dims = ["section", "year", "surface_category", "type_local"]
+
+min_prix_m2 = 500 # remove absurd prices
+
+# Price distributions are stored as quantile sketches of at most `sketch_size`
+# (value, weight) centroids. A cell of n prices is cut into sorted runs of at most
+# ceil(n / sketch_size) prices, each replaced by its mean weighted by its length:
+# cells with n <= sketch_size are kept exact. A quantile read from a union of
+# cells is off by at most sum(ceil(n_i / sketch_size)) ranks, about 1% of the
+# transactions with the default size, and always lies between the true values at
+# those ranks. Smoothing weights every cell by w_i and concatenates sketches
+# without compressing them again, so the bound becomes sum(w_i * ceil(n_i / sketch_size))
+# in weighted ranks. Compressing a merged sketch (`rollup_cube` with `compress`)
+# adds up to its total weight / sketch_size more ranks.
+sketch_size = 100
+
+sketch_columns = ["sketch_values", "sketch_weights"]
+
+def build_price_cube(df: pl.DataFrame)-> pl.DataFrame:
+    """One row per cube cell: transaction count, price sum and price quantile sketch.
+
+    Prices under `min_prix_m2` are left out, as every app statistic does.
+    """
+    rank = pl.int_range(pl.len()).over(cube_dims)
+    return (
+        df
+        .filter(pl.col('prix_m2') > min_prix_m2)
+        .sort('prix_m2')
+        .with_columns(bucket = (rank * sketch_size // pl.len().over(cube_dims)))
+        .group_by(*cube_dims, 'bucket')
+        .agg(
+            value = pl.mean('prix_m2'),
+            weight = pl.len(),
+            sum_prix_m2 = pl.sum('prix_m2')
+        )
+        .sort('value')
+        .group_by(cube_dims)
+        .agg(
+            nb_transactions = pl.sum('weight'),
+            sum_prix_m2 = pl.sum('sum_prix_m2'),
+            sketch_values = pl.col('value'),
+            sketch_weights = pl.col('weight')
+        )
+        .sort(cube_dims)
+    )
+
+def write_price_cube(df: pl.DataFrame)-> pl.DataFrame:
+    cube = build_price_cube(df)
+    cube.write_parquet(price_cube_path, statistics=True)
+    return cube
+
+def read_price_cube()-> pl.DataFrame | None:
+    """The stored cube, None when missing or written with an older layout."""
+    if not price_cube_path.exists():
+        return None
+    cube = pl.read_parquet(price_cube_path)
+    return cube if set(sketch_columns) <= set(cube.columns) else None
+
+def filter_cube(
+        cube: pl.DataFrame,
+        sections: list[str] = None,
+        housing_type: list[str] = None,
+        surface_selection: list[str] = None,
+        year_range: list[int] = None
+)-> pl.DataFrame:
+    """Keep the cells matching every given filter, None meaning no filter."""
+    filters = []
+    if sections is not None:
+        filters.append(pl.col('section').is_in(sections))
+    if housing_type is not None:
+        filters.append(pl.col('type_local').is_in(housing_type))
+    if surface_selection is not None:
+        filters.append(pl.col('surface_category').is_in(surface_selection))
+    if year_range is not None:
+        filters.append(pl.col('year').is_between(year_range[0], year_range[1]))
+    return cube.filter(*filters) if filters else cube
+
+def sketch_quantile(quantile: float, mask: pl.Expr = None)-> pl.Expr:
+    """Quantile of the merged sketches of a group, to use inside `group_by(...).agg`.
+
+    Only the cells matching `mask` are merged when it is given.
+    Centroids count as `weight` copies of their value and the result is linearly
+    interpolated like `pl.median`, so it is exact when every cell is exact.
+    """
+    values = pl.col('sketch_values')
+    weights = pl.col('sketch_weights')
+    if mask is not None:
+        values, weights = values.filter(mask), weights.filter(mask)
+    values = values.explode()
+    weights = weights.explode().sort_by(values)
+    values = values.sort()
+    cum_weights = weights.cum_sum()
+    position = (weights.sum() - 1) * quantile
+    lower = values.filter(cum_weights > position.floor()).first()
+    upper = values.filter(cum_weights > position.ceil()).first()
+    return lower + (upper - lower) * (position - position.floor())
+
+def aggregate_cube(
+        cube: pl.DataFrame,
+        granularity: list[str],
+        quantiles: dict[str, float] = None
+)-> pl.DataFrame:
+    """Roll cells up to `granularity`: mean and median price per m² and transaction count.
+
+    `quantiles` adds other percentiles, e.g. `{"prix_q90_m2": 0.9}`.
+    """
+    quantiles = quantiles or dict()
+    return (
+        cube
+        .group_by(granularity)
+        .agg(
+            prix_moyen_m2 = pl.sum('sum_prix_m2') / pl.sum('nb_transactions'),
+            prix_median_m2 = sketch_quantile(0.5),
+            nb_transactions = pl.sum('nb_transactions'),
+            **{name: sketch_quantile(quantile) for name, quantile in quantiles.items()}
+        )
+    )
+
+
+def rollup_cube(
+        cube: pl.DataFrame,
+        granularity: list[str],
+        compress: bool = True
+)-> pl.DataFrame:
+    """Merge cells up to `granularity`, keeping counts, sums and a sketch per merged cell.
+
+    With `compress`, the merged sketch is compressed back to `sketch_size` centroids
+    by cutting its cumulated weight into equal runs; it stays exact while its total
+    weight fits. Otherwise the centroids are concatenated, keeping the error bound
+    of the merged cells.
+    """
+    if not compress:
+        return (
+            cube
+            .group_by(granularity)
+            .agg(
+                pl.sum('nb_transactions'),
+                pl.sum('sum_prix_m2'),
+                pl.col('sketch_values').explode(),
+                pl.col('sketch_weights').explode()
+            )
+        )
+    centroids = (
+        cube
+        .select(*granularity, 'sketch_values', 'sketch_weights')
+        .explode(sketch_columns)
+        .sort('sketch_values')
+        .with_columns(
+            bucket = (
+                (pl.col('sketch_weights').cum_sum() - pl.col('sketch_weights')).over(granularity)
+                * sketch_size
+                // pl.col('sketch_weights').sum().over(granularity)
+            ).cast(pl.Int64)
+        )
+        .group_by(*granularity, 'bucket')
+        .agg(
+            value = (pl.col('sketch_values') * pl.col('sketch_weights')).sum() / pl.sum('sketch_weights'),
+            weight = pl.sum('sketch_weights')
+        )
+        .sort('value')
+        .group_by(granularity)
+        .agg(
+            sketch_values = pl.col('value'),
+            sketch_weights = pl.col('weight')
+        )
+    )
+    return (
+        cube
+        .group_by(granularity)
+        .agg(
+            pl.sum('nb_transactions'),
+            pl.sum('sum_prix_m2')
+        )
+        .join(centroids, on=granularity, how='left', nulls_equal=True)
+    )
+
+def neighbourhood_weights(
+        adjacency_graph: AdjacencyGraph,
+        k: int = 1,
+        decay: float = 1.0
+)-> pl.DataFrame:
+    """Sparse smoothing matrix in COO form: (section, neighbour, weight = decay ** hops)."""
+    rows, cols, hops = adjacency_graph.k_hop_pairs(k)
+    names = pl.Series(adjacency_graph.names, dtype=pl.String)
+    return pl.DataFrame({
+        "section": names.gather(rows),
+        "neighbour": names.gather(cols),
+        "weight": decay ** hops.astype(float)
+    })
+
+def smooth_cube(
+        cube: pl.DataFrame,
+        adjacency_graph: AdjacencyGraph,
+        k: int = 1,
+        decay: float = 1.0
+)-> pl.DataFrame:
+    """Replace each section's cells by the weighted union of its neighbourhood's cells.
+
+    This is the product of the sparse weight matrix with the per-cell sufficient
+    statistics: counts and sums are weighted, and so are the sketch weights, so
+    means and quantiles of a section become those of its neighbourhood. Roll the
+    cube up to the queried granularity first to keep the product small. Sketches
+    are concatenated, not compressed again (see `sketch_size` for the error bound).
+    """
+    dims = [col for col in cube.columns if col not in ["section", "nb_transactions", "sum_prix_m2", *sketch_columns]]
+    return (
+        neighbourhood_weights(adjacency_graph, k, decay)
+        # the weights are keyed by String section names, whatever the cube's dtype
+        .join(cube.with_columns(pl.col('section').cast(pl.String)), left_on='neighbour', right_on='section')
+        .with_columns(
+            pl.col('nb_transactions') * pl.col('weight'),
+            pl.col('sum_prix_m2') * pl.col('weight'),
+            pl.col('sketch_weights') * pl.col('weight')
+        )
+        .drop('neighbour', 'weight')
+        .pipe(rollup_cube, ['section', *dims], compress=False)
+    )
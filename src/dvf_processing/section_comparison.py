@@ -0,0 +1,88 @@
+import polars as pl
+from src.dvf_processing.price_cube import sketch_quantile, aggregate_cube
+from src.cadastres.adjacency_graph import AdjacencyGraph
+
+def section_type_masks(
+        section_choice: str,
+        adjacing_sections: AdjacencyGraph | dict[str, list]
+)-> dict[str, pl.Expr]:
+    """Cells counted in each compared group; other_section is every cell."""
+    adjacing_sections_filtered = [c for c in adjacing_sections[section_choice] if c != section_choice]
+    return {
+        "choosen_section": pl.col('section') == section_choice,
+        "adjacing_section": pl.col('section').is_in(adjacing_sections_filtered),
+        "other_section": pl.lit(True)
+    }
+
+def compare_sections(
+        cube: pl.DataFrame,
+        section_choice: str,
+        adjacing_sections: AdjacencyGraph | dict[str, list],
+        by_year: bool = False
+)-> pl.DataFrame:
+    """Mean, median and count for the chosen section, its neighbours and all sections.
+
+    The three groups are masked aggregations of the same cells, computed in one
+    pass without copying any cell. Returns one row per section_type (and year).
+    """
+    stats = [
+        pl.struct(
+            mean_price_m2 = pl.col('sum_prix_m2').filter(mask).sum() / pl.col('nb_transactions').filter(mask).sum(),
+            median_price_m2 = sketch_quantile(0.5, mask),
+            nb_transactions = pl.col('nb_transactions').filter(mask).sum()
+        ).alias(section_type)
+        for section_type, mask in section_type_masks(section_choice, adjacing_sections).items()
+    ]
+    index = ["year"] if by_year else []
+    comparison = cube.group_by(index).agg(stats) if by_year else cube.select(stats)
+    return (
+        comparison
+        .unpivot(index=index, variable_name='section_type', value_name='stats')
+        .unnest('stats')
+        .filter(pl.col('nb_transactions') > 0)
+    )
+
+def compare_all_sections(
+        cube: pl.DataFrame,
+        adjacency_graph: AdjacencyGraph,
+        by_year: bool = False
+)-> pl.DataFrame:
+    """`compare_sections` for every section of the graph at once, with a `section` column."""
+    # the graph's section names are Strings, a Categorical cube would not join on them
+    cube = cube.with_columns(pl.col('section').cast(pl.String))
+    index = ["year"] if by_year else []
+    neighbours = (
+        pl.DataFrame({
+            "target": adjacency_graph.names,
+            "section": [adjacency_graph[name] for name in adjacency_graph.names]
+        })
+        .explode('section')
+        .filter(pl.col('target') != pl.col('section'))
+    )
+    renamed = {
+        "prix_moyen_m2": "mean_price_m2",
+        "prix_median_m2": "median_price_m2"
+    }
+    chosen = (
+        aggregate_cube(cube, ['section', *index])
+        .rename(renamed)
+        .with_columns(section_type = pl.lit('choosen_section'))
+    )
+    adjacent = (
+        neighbours
+        .join(cube, on='section')
+        .drop('section')
+        .rename({'target': 'section'})
+        .pipe(aggregate_cube, ['section', *index])
+        .rename(renamed)
+        .with_columns(section_type = pl.lit('adjacing_section'))
+    )
+    everything = aggregate_cube(cube.with_columns(all = pl.lit(True)), ['all', *index]).drop('all').rename(renamed)
+    sections = pl.DataFrame({"section": adjacency_graph.names})
+    other = (
+        sections
+        .join(everything, how='cross')
+        .with_columns(section_type = pl.lit('other_section'))
+    )
+    columns = ['section', *index, 'section_type', 'mean_price_m2', 'median_price_m2', 'nb_transactions']
+    return pl.concat([df.select(columns) for df in [chosen, adjacent, other]], how="vertical_relaxed")
@@ -0,0 +1,87 @@
+import polars as pl
+import numpy as np
+
+index_sort_cols = ["section", "parcelle", "year"]
+
+def is_sorted_by(df: pl.DataFrame, cols: list[str])->bool:
+    """Whether the rows are in lexicographic order of `cols`, checked in one pass."""
+    in_order = pl.lit(True)
+    for col in reversed(cols):
+        previous = pl.col(col).shift()
+        in_order = (previous < pl.col(col)) | ((previous == pl.col(col)) & in_order)
+    return df.select(in_order.fill_null(True).all()).item()
+
+class SectionIndex:
+    """Cleaned transactions clustered by section, with an offset table.
+
+    Rows are sorted by `index_sort_cols`; the transactions of section `names[i]` are
+    the rows `offsets[i]:offsets[i + 1]`, so section filters are zero-copy slices.
+    """
+
+    def __init__(self, df: pl.DataFrame, names: list[str], offsets: np.ndarray):
+        self.df = df
+        self.names = names
+        self.offsets = offsets
+        self.index = {name: i for i, name in enumerate(names)}
+
+    @classmethod
+    def from_frame(cls, df: pl.DataFrame)->"SectionIndex":
+        """Index `df`, sorting it first unless it is already in index order (e.g. as published).
+
+        Sections are indexed as Strings, so they come out in lexical order: a
+        Categorical would sort by its physical order.
+        """
+        df = df.with_columns(pl.col('section').cast(pl.String))
+        if not is_sorted_by(df, index_sort_cols):
+            df = df.sort(index_sort_cols)
+        runs = df.get_column("section").rle()
+        offsets = np.zeros(len(runs) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(runs.struct.field("len").to_numpy())
+        return cls(df, runs.struct.field("value").to_list(), offsets)
+
+    @property
+    def sections(self)->list[str]:
+        return self.names
+
+    def __len__(self)->int:
+        return len(self.names)
+
+    def __contains__(self, section: str)->bool:
+        return section in self.index
+
+    def __getitem__(self, section: str)->pl.DataFrame:
+        return self.rows([section])
+
+    def row_ranges(self, sections: list[str])->list[tuple[int, int]]:
+        """(start, end) row ranges of `sections` in index order, adjacent ranges merged."""
+        positions = sorted({self.index[section] for section in sections if section in self.index})
+        ranges = []
+        for i in positions:
+            start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+        return ranges
+
+    def rows(self, sections: list[str])->pl.DataFrame:
+        """Transactions of `sections`, as slices of the indexed frame (no copy, no scan)."""
+        slices = [self.df.slice(start, end - start) for start, end in self.row_ranges(sections)]
+        if not slices:
+            return self.df.clear()
+        return slices[0] if len(slices) == 1 else pl.concat(slices, rechunk=False)
+
+    def parcel_rows(self, parcelle: str, section: str = None)->pl.DataFrame:
+        """Transactions of one parcel, by binary search within its section.
+
+        A parcel code starts with its section code, which is used when `section` is not given.
+        """
+        if section is None:
+            section = next((parcelle[:i] for i in range(len(parcelle), 0, -1) if parcelle[:i] in self.index), None)
+        if section not in self.index:
+            return self.df.clear()
+        section_rows = self[section]
+        parcelles = section_rows.get_column("parcelle")
+        start = parcelles.search_sorted(parcelle, side="left")
+        end = parcelles.search_sorted(parcelle, side="right")
+        return section_rows.slice(start, end - start)
@@ -1,9 +1,17 @@
 import polars as pl
+import pyarrow.parquet as pq
 from datetime import date
 from src.core import config
+from src.utils import load_json
 from pathlib import Path
+from typing import Iterator
 from caseconverter import snakecase
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from logzero import logger
+import hashlib
 import json
+import shutil
+import time
 
 dvf_column_types = {
     "Identifiant de document": str,
@@ -51,44 +59,387 @@ dvf_column_types = {
     "Surface terrain": int
 }
 
-def load_dvf(file_path: Path)->pl.DataFrame:
+# Low-cardinality strings are dictionary-encoded and counts use the narrowest
+# integer width that fits. Closed sets from the DGFiP specification are Enums.
+nature_mutation_enum = pl.Enum([
+    "Vente",
+    "Vente en l'état futur d'achèvement",
+    "Vente terrain à bâtir",
+    "Adjudication",
+    "Echange",
+    "Expropriation"
+])
+
+type_local_enum = pl.Enum([
+    "Appartement",
+    "Maison",
+    "Dépendance",
+    "Local industriel. commercial ou assimilé"
+])
+
+dvf_compact_overrides = {
+    "No disposition": pl.Int16,
+    "Nature mutation": nature_mutation_enum,
+    "No voie": pl.Int32,
+    "B/T/Q": pl.Categorical,
+    "Type de voie": pl.Categorical,
+    "Code postal": pl.Categorical,
+    "Commune": pl.Categorical,
+    "Code departement": pl.Categorical,
+    "Code commune": pl.Categorical,
+    "Prefixe de section": pl.Categorical,
+    "Section": pl.Categorical,
+    "Surface Carrez du 1er lot": pl.Float32,
+    "Surface Carrez du 2eme lot": pl.Float32,
+    "Surface Carrez du 3eme lot": pl.Float32,
+    "Surface Carrez du 4eme lot": pl.Float32,
+    "Surface Carrez du 5eme lot": pl.Float32,
+    "Nombre de lots": pl.UInt16,
+    "Code type local": pl.Int8,
+    "Type local": type_local_enum,
+    "Surface reelle bati": pl.Int32,
+    "Nombre pieces principales": pl.Int16,
+    "Nature culture": pl.Categorical,
+    "Nature culture speciale": pl.Categorical,
+    "Surface terrain": pl.Int32
+}
+
+dvf_compact_column_types = {**dvf_column_types, **dvf_compact_overrides}
+
+def get_dvf_column_types(compact: bool = False)->dict:
+    return dvf_compact_column_types if compact else dvf_column_types
+
+def compact_dvf(
+        df: pl.DataFrame | pl.LazyFrame,
+        keep_strings: tuple[str, ...] = ()
+)->pl.DataFrame | pl.LazyFrame:
+    """Cast an already renamed DVF frame to the compact schema, except the `keep_strings` columns."""
+    return df.cast({
+        snakecase(col): dtype for col, dtype in dvf_compact_overrides.items()
+        if snakecase(col) not in keep_strings
+    })
+
+def load_dvf(file_path: Path, compact: bool = False)->pl.DataFrame:
     df = (
         pl
         .read_csv(
             file_path,
             separator="|",
-            schema_overrides=dvf_column_types,
+            schema_overrides=get_dvf_column_types(compact),
             decimal_comma=True,
             try_parse_dates=True
         )
     )
     return df.rename({col: snakecase(col) for col in df.columns})
 
-def load_dvf_for_year(year: int) -> pl.DataFrame:
+def scan_dvf(file_path: Path, compact: bool = False)->pl.LazyFrame:
+    """Lazily scan a DVF file so filters and column selections are pushed down into the CSV reader."""
+    return (
+        pl
+        .scan_csv(
+            file_path,
+            separator="|",
+            schema_overrides=get_dvf_column_types(compact),
+            decimal_comma=True,
+            try_parse_dates=True
+        )
+        .rename(snakecase)
+    )
+
+def iter_dvf_batches(
+    file_path: Path,
+    batch_size: int = 100_000,
+    transform: callable = None,
+    compact: bool = False
+) -> Iterator[pl.DataFrame]:
+    """Read a DVF file in record batches of `batch_size` rows.
+
+    Each batch gets the same schema and renaming as `load_dvf`, then `transform`.
+    Only one batch is held in memory at a time, so the transform must be row-wise
+    (filters, new columns) for the concatenated output to match the eager path.
+    """
+    reader = pl.read_csv_batched(
+        file_path,
+        separator="|",
+        schema_overrides=get_dvf_column_types(compact),
+        decimal_comma=True,
+        try_parse_dates=True,
+        batch_size=batch_size
+    )
+    while batches := reader.next_batches(1):
+        for batch in batches:
+            batch = batch.rename({col: snakecase(col) for col in batch.columns})
+            yield batch.pipe(transform) if transform else batch
+
+def load_dvf_streaming(
+    file_path: Path,
+    batch_size: int = 100_000,
+    transform: callable = None,
+    compact: bool = False
+) -> pl.DataFrame:
+    """Same result as `load_dvf(file_path).pipe(transform)` with memory bounded by the batch size."""
+    # compact batches share one Categorical dictionary so they concatenate without remapping
+    with pl.StringCache():
+        return pl.concat(iter_dvf_batches(file_path, batch_size, transform, compact))
+
+def write_dvf_streaming(
+    file_path: Path,
+    output_path: Path,
+    batch_size: int = 100_000,
+    transform: callable = None,
+    compact: bool = False
+) -> Path:
+    """Stream a DVF file to a Parquet file, one row group per batch."""
+    writer = None
+    try:
+        for batch in iter_dvf_batches(file_path, batch_size, transform, compact):
+            table = batch.to_arrow()
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return output_path
+
+def get_dvf_file_path(year: int) -> Path:
     dvf_files = (config.data_dir / "dvf-data").glob('*.csv')
     file_path = [c for c in dvf_files if str(year) in c.__str__()]
     assert len(file_path) == 1, f"wrong year of multiple results in the folder, list of files detected: {file_path}"
-    file_path = file_path[0]
-    return load_dvf(file_path)
+    return file_path[0]
 
+def compute_fingerprint(file_path: Path)->dict:
+    """Size, mtime and sha256 of a source file, used to detect stale caches."""
+    stat = file_path.stat()
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(chunk)
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": sha256.hexdigest()
+    }
 
-def load_dvf_years(
-    years: list[int] | int = None, 
-    transform: callable= None
+def get_cache_dir(year: int) -> Path:
+    return config.dvf_cache_dir / str(year)
+
+def check_fingerprint(file_path: Path, cached: dict)->dict | None:
+    """Return the current fingerprint of `file_path` if its content matches `cached`, else None.
+
+    The content hash is only computed when the file was touched without changing size.
+    """
+    stat = file_path.stat()
+    if cached["size"] != stat.st_size:
+        return None
+    if cached["mtime_ns"] == stat.st_mtime_ns:
+        return cached
+    fingerprint = compute_fingerprint(file_path)
+    return fingerprint if fingerprint["sha256"] == cached["sha256"] else None
+
+def is_cache_valid(file_path: Path, cache_dir: Path)->bool:
+    metadata_path = cache_dir / "metadata.json"
+    if not metadata_path.exists():
+        return False
+    metadata = load_json(metadata_path)
+    fingerprint = check_fingerprint(file_path, metadata["fingerprint"])
+    if fingerprint is None:
+        return False
+    if fingerprint != metadata["fingerprint"]:
+        metadata["fingerprint"] = fingerprint
+        with open(metadata_path, "w") as f:
+            json.dump(metadata, f)
+    return True
+
+def build_dvf_cache(year: int, batch_size: int = 100_000)->Path:
+    """Convert a DVF year file to typed Parquet, partitioned by `code_departement`.
+
+    The file is streamed with `iter_dvf_batches`: each batch is split by department
+    and appended to that department's Parquet file, so only one batch is in memory.
+    """
+    file_path = get_dvf_file_path(year)
+    cache_dir = get_cache_dir(year)
+    tmp_dir = cache_dir.with_name(f"{cache_dir.name}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    logger.info(f"Building the Parquet cache of DVF {year} in {cache_dir}")
+
+    writers = dict()
+    columns = None
+    try:
+        for batch in iter_dvf_batches(file_path, batch_size):
+            columns = batch.columns
+            for (department,), part in batch.partition_by("code_departement", as_dict=True, include_key=False).items():
+                table = part.to_arrow()
+                if department not in writers:
+                    department_dir = tmp_dir / "data" / f"code_departement={department}"
+                    department_dir.mkdir(parents=True)
+                    writers[department] = pq.ParquetWriter(department_dir / "0.parquet", table.schema)
+                writers[department].write_table(table)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    with open(tmp_dir / "metadata.json", "w") as f:
+        json.dump({"fingerprint": compute_fingerprint(file_path), "columns": columns}, f)
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    tmp_dir.rename(cache_dir)
+    return cache_dir
+
+def scan_dvf_cache(year: int)->pl.LazyFrame:
+    """Scan the Parquet cache of a year, (re)building it if the source file changed."""
+    file_path = get_dvf_file_path(year)
+    cache_dir = get_cache_dir(year)
+    if not is_cache_valid(file_path, cache_dir):
+        build_dvf_cache(year)
+    columns = load_json(cache_dir / "metadata.json")["columns"]
+    return (
+        pl
+        .scan_parquet(
+            cache_dir / "data" / "**" / "*.parquet",
+            hive_partitioning=True,
+            hive_schema={"code_departement": pl.String}
+        )
+        .select(columns)
+    )
+
+def has_dvf_cache(year: int, use_cache: bool = True, build_cache: bool = False)->bool:
+    """Whether a year is read from its Parquet cache.
+
+    A valid cache is read when `use_cache`; the cache is only (re)built on the
+    explicit `build_cache` opt-in, otherwise a stale or missing cache means the CSV
+    is parsed and nothing is written.
+    """
+    if not use_cache:
+        return False
+    return build_cache or is_cache_valid(get_dvf_file_path(year), get_cache_dir(year))
+
+def load_dvf_for_year(
+    year: int,
+    use_cache: bool = True,
+    compact: bool = False,
+    build_cache: bool = False
 ) -> pl.DataFrame:
-    """Load and optionally transform DVF data for multiple years."""
+    if has_dvf_cache(year, use_cache, build_cache):
+        df = scan_dvf_cache(year)
+        return (df.pipe(compact_dvf) if compact else df).collect()
+    return load_dvf(get_dvf_file_path(year), compact)
+
+def scan_dvf_for_year(
+    year: int,
+    use_cache: bool = True,
+    compact: bool = False,
+    build_cache: bool = False
+) -> pl.LazyFrame:
+    if has_dvf_cache(year, use_cache, build_cache):
+        df = scan_dvf_cache(year)
+        return df.pipe(compact_dvf) if compact else df
+    return scan_dvf(get_dvf_file_path(year), compact)
+
+def scan_dvf_years(
+    years: list[int] | int = None, 
+    transform: callable= None,
+    use_cache: bool = True,
+    compact: bool = False,
+    build_cache: bool = False
+) -> pl.LazyFrame:
+    """Lazily scan and optionally transform DVF data for multiple years."""
     if type(years) == int:
         years = [years]
     years = years or list(range(2020, 2025))
     
-    dataframes = [
-        load_dvf_for_year(year).pipe(transform) if transform else load_dvf_for_year(year)
+    lazyframes = [
+        scan_dvf_for_year(year, use_cache, compact, build_cache).pipe(transform) if transform else scan_dvf_for_year(year, use_cache, compact, build_cache)
         for year in years
     ]
     
-    return pl.concat(dataframes)
+    return pl.concat(lazyframes)
+
+def load_transformed_year(
+    year: int,
+    transform: callable = None,
+    use_cache: bool = True,
+    compact: bool = False,
+    build_cache: bool = False
+) -> tuple[pl.DataFrame, float]:
+    """Load and transform one year, returning the frame and the elapsed seconds."""
+    start = time.perf_counter()
+    lf = scan_dvf_for_year(year, use_cache, compact, build_cache)
+    df = (lf.pipe(transform) if transform else lf).collect()
+    elapsed = time.perf_counter() - start
+    logger.info(f"Loaded DVF {year}: {len(df)} rows in {elapsed:.1f}s")
+    return df, elapsed
+
+def load_dvf_years_parallel(
+    years: list[int],
+    transform: callable = None,
+    use_cache: bool = True,
+    n_workers: int = 4,
+    compact: bool = False,
+    build_cache: bool = False
+) -> tuple[list[pl.DataFrame], dict[int, float]]:
+    """Load years concurrently with at most `n_workers` years in flight.
+
+    Threads are enough here: polars releases the GIL while parsing and collecting.
+    Frames are returned in the order of `years`.
+    """
+    results = dict()
+    timings = dict()
+    years_to_submit = iter(years)
+
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        pending = dict()
+
+        def submit_next():
+            year = next(years_to_submit, None)
+            if year is not None:
+                pending[executor.submit(load_transformed_year, year, transform, use_cache, compact, build_cache)] = year
+
+        for _ in range(n_workers):
+            submit_next()
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                year = pending.pop(future)
+                results[year], timings[year] = future.result()
+                submit_next()
+
+    return [results[year] for year in years], timings
+
+def load_dvf_years(
+    years: list[int] | int = None, 
+    transform: callable= None,
+    use_cache: bool = True,
+    n_workers: int = None,
+    return_timings: bool = False,
+    compact: bool = False,
+    build_cache: bool = False
+) -> pl.DataFrame | tuple[pl.DataFrame, dict[int, float]]:
+    """Load and optionally transform DVF data for multiple years.
+
+    The files are scanned lazily, so filters and projections done in `transform`
+    are applied while reading instead of on the full national file.
+    With `n_workers`, years are loaded concurrently (see `load_dvf_years_parallel`).
+    With `return_timings`, the per-year loading time in seconds is returned as well.
+    With `compact`, columns use `dvf_compact_column_types` (categoricals, narrow ints).
+    Valid Parquet caches are read unless `use_cache` is False; with `build_cache`,
+    missing or stale caches are (re)built first instead of parsing the CSV.
+    """
+    if type(years) == int:
+        years = [years]
+    years = years or list(range(2020, 2025))
+
+    # compact years share one Categorical dictionary so they concatenate without remapping
+    with pl.StringCache():
+        if n_workers:
+            dataframes, timings = load_dvf_years_parallel(years, transform, use_cache, n_workers, compact, build_cache)
+        else:
+            dataframes, timings = list(), dict()
+            for year in years:
+                df, timings[year] = load_transformed_year(year, transform, use_cache, compact, build_cache)
+                dataframes.append(df)
 
-def load_json(file_path: Path)->dict:
-    with open(file_path, "r") as f:
-        json_file = json.load(f)
-    return json_file
\ No newline at end of file
+        df = pl.concat(dataframes)
+    return (df, timings) if return_timings else df
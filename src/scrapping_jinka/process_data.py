@@ -6,6 +6,10 @@ from glob import glob
 import json
 import shutil
 from logzero import logger
+from shapely import STRtree
+from shapely.geometry.base import BaseGeometry
+import numpy as np
+import shapely
 
 RELEVANT_COLS = [
     "uuid",
@@ -78,3 +82,45 @@ def save_df(df: pd.DataFrame):
         shutil.move(file_path, old_file_path)
 
     df.to_csv(file_path, index = False)
+
+
+def assign_sections(
+        df: pl.DataFrame,
+        polygon_data: dict[str, BaseGeometry],
+        lat_col: str = "lat",
+        lng_col: str = "lng"
+) -> pl.DataFrame:
+    """Add the cadastre `section` containing each listing, null when outside every section.
+
+    All listings are matched in one batched STRtree query; a point lying on a border
+    gets the first section found.
+    """
+    names = np.array(list(polygon_data.keys()), dtype=object)
+    tree = STRtree(np.array(list(polygon_data.values()), dtype=object))
+
+    lng = df.get_column(lng_col).cast(pl.Float64).fill_null(np.nan).to_numpy()
+    lat = df.get_column(lat_col).cast(pl.Float64).fill_null(np.nan).to_numpy()
+    point_indices, section_indices = tree.query(shapely.points(lng, lat), predicate="intersects")
+    point_indices, first = np.unique(point_indices, return_index=True)
+
+    sections = np.full(len(df), None, dtype=object)
+    sections[point_indices] = names[section_indices[first]]
+    return df.with_columns(section=pl.Series(sections, dtype=pl.String))
+
+def calculate_rent_per_section(df: pl.DataFrame) -> pl.DataFrame:
+    """Rent per m² by section, in the same shape as the DVF price tables."""
+    return (
+        df
+        .filter(
+            pl.col('section').is_not_null(),
+            pl.col('area') > 0
+        )
+        .with_columns(loyer_m2 = pl.col('rent').cast(pl.Float64) / pl.col('area').cast(pl.Float64))
+        .group_by('section')
+        .agg(
+            pl.mean('loyer_m2').alias('loyer_moyen_m2'),
+            pl.median('loyer_m2').alias('loyer_median_m2'),
+            pl.len().alias('nb_annonces')
+        )
+        .sort('section')
+    )
@@ -1,5 +1,6 @@
 from src.scrapping_jinka import scrapper_utils as utils
-from src.scrapping_jinka.process_data import create_df_from_raw, filter_nice_rent_data
+from src.scrapping_jinka.process_data import create_df_from_raw, filter_nice_rent_data, assign_sections, calculate_rent_per_section
+from src.cadastres.geometry_store import load_section_geometries
 from src.core import config
 
 def scrap_jinka():
@@ -17,5 +18,6 @@ def scrap_jinka():
 if __name__ == "__main__":
     scrap_jinka()
     df = create_df_from_raw()
-    filtered_df = df.pipe(filter_nice_rent_data)
-    filtered_df.write_csv(config.data_dir / "jinka-csv" / "rent_nice_jinka.csv")
\ No newline at end of file
+    filtered_df = df.pipe(filter_nice_rent_data).pipe(assign_sections, load_section_geometries())
+    filtered_df.write_csv(config.data_dir / "jinka-csv" / "rent_nice_jinka.csv")
+    filtered_df.pipe(calculate_rent_per_section).write_csv(config.data_dir / "jinka-csv" / "rent_per_section.csv")
\ No newline at end of file
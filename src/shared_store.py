@@ -0,0 +1,161 @@
+from src.core import config
+from src.cadastres.adjacency_graph import AdjacencyGraph
+from src.utils import save_json
+from shapely.geometry.base import BaseGeometry
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+import polars as pl
+import pyarrow as pa
+import numpy as np
+import shapely
+import shutil
+import os
+
+# Published artifacts live in data/published/<version>/ as uncompressed Arrow IPC
+# files, so every app process memory-maps them and the OS page cache shares the
+# physical pages. CURRENT names the live version and is replaced atomically.
+published_dir = config.data_dir / "published"
+current_path = published_dir / "CURRENT"
+
+def current_version()->str | None:
+    return current_path.read_text().strip() if current_path.exists() else None
+
+def get_version_dir(version: str)->Path:
+    return published_dir / version
+
+def write_ipc_table(table: pa.Table, file_path: Path)->None:
+    with pa.OSFile(str(file_path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+def read_ipc_table(file_path: Path)->pa.Table:
+    """Zero-copy read: buffers point into the memory-mapped file."""
+    return pa.ipc.open_file(pa.memory_map(str(file_path), "r")).read_all()
+
+def geometries_to_table(geometries: dict[str, BaseGeometry])->pa.Table:
+    """GeoArrow-style nested lists built straight from shapely's ragged arrays."""
+    geometry_type, coords, offsets = shapely.to_ragged_array(np.array(list(geometries.values()), dtype=object))
+    column = pa.FixedSizeListArray.from_arrays(pa.array(coords.ravel()), coords.shape[1])
+    for offset in offsets:
+        column = pa.LargeListArray.from_arrays(pa.array(offset, type=pa.int64()), column)
+    return pa.table(
+        {"section": pa.array(list(geometries.keys()), type=pa.string()), "geometry": column},
+        metadata={"geometry_type": str(int(geometry_type)), "coords_dim": str(coords.shape[1])}
+    )
+
+def table_to_geometries(table: pa.Table)->dict[str, BaseGeometry]:
+    """Rebuild the shapely geometries over the mapped coordinate buffers.
+
+    Only the Arrow buffers are shared between processes: the GEOS objects built here
+    are private to each process, so geometry memory still grows with the number of
+    app workers.
+    """
+    metadata = table.schema.metadata
+    column = table.column("geometry").combine_chunks()
+    offsets = []
+    while pa.types.is_large_list(column.type):
+        offsets.append(column.offsets.to_numpy())
+        column = column.values
+    coords = column.values.to_numpy().reshape(-1, int(metadata[b"coords_dim"]))
+    geometries = shapely.from_ragged_array(
+        shapely.GeometryType(int(metadata[b"geometry_type"])),
+        coords,
+        tuple(reversed(offsets))
+    )
+    return dict(zip(table.column("section").to_pylist(), geometries))
+
+def graph_to_table(adjacency_graph: AdjacencyGraph)->pa.Table:
+    """The CSR arrays are exactly the offsets and values of a list column."""
+    neighbours = pa.LargeListArray.from_arrays(
+        pa.array(np.asarray(adjacency_graph.indptr), type=pa.int64()),
+        pa.array(np.asarray(adjacency_graph.indices), type=pa.int32())
+    )
+    return pa.table({"section": pa.array(adjacency_graph.names, type=pa.string()), "neighbours": neighbours})
+
+def table_to_graph(table: pa.Table)->AdjacencyGraph:
+    neighbours = table.column("neighbours").combine_chunks()
+    return AdjacencyGraph(
+        table.column("section").to_pylist(),
+        neighbours.offsets.to_numpy(),
+        neighbours.values.to_numpy()
+    )
+
+def publish_artifacts(
+        frames: dict[str, pl.DataFrame],
+        geometries: dict[str, BaseGeometry],
+        adjacency_graph: AdjacencyGraph,
+        keep_versions: int = 2
+)->str:
+    """Write a new version and switch CURRENT to it atomically.
+
+    Running app processes pick it up on their next read of CURRENT; older versions
+    beyond `keep_versions` are removed (already mapped files stay readable).
+    """
+    version = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    version_dir = get_version_dir(version)
+    tmp_dir = version_dir.with_name(f"{version}.tmp")
+    tmp_dir.mkdir(parents=True)
+
+    for name, df in frames.items():
+        df.write_ipc(tmp_dir / f"{name}.arrow", compression="uncompressed")
+    write_ipc_table(geometries_to_table(geometries), tmp_dir / "geometries.arrow")
+    write_ipc_table(graph_to_table(adjacency_graph), tmp_dir / "adjacency.arrow")
+    save_json(tmp_dir / "metadata.json", {
+        "version": version,
+        "frames": {name: len(df) for name, df in frames.items()},
+        "nb_sections": len(geometries)
+    })
+    tmp_dir.rename(version_dir)
+
+    tmp_current_path = current_path.with_name("CURRENT.tmp")
+    tmp_current_path.write_text(version)
+    os.replace(tmp_current_path, current_path)
+
+    versions = sorted(path for path in published_dir.iterdir() if path.is_dir() and not path.name.endswith(".tmp"))
+    for old_version_dir in versions[:-keep_versions]:
+        shutil.rmtree(old_version_dir, ignore_errors=True)
+    return version
+
+def read_published_frame(name: str, version: str)->pl.DataFrame:
+    return pl.read_ipc(get_version_dir(version) / f"{name}.arrow", memory_map=True)
+
+def read_published_geometries(version: str)->dict[str, BaseGeometry]:
+    return table_to_geometries(read_ipc_table(get_version_dir(version) / "geometries.arrow"))
+
+def read_published_adjacency(version: str)->AdjacencyGraph:
+    return table_to_graph(read_ipc_table(get_version_dir(version) / "adjacency.arrow"))
+
+@dataclass(frozen=True)
+class ArtifactBundle:
+    """Everything the app pages need, from a single dataset version."""
+    version: str
+    data: pl.DataFrame
+    price_cube: pl.DataFrame
+    geometries: dict[str, BaseGeometry]
+    adjacency: AdjacencyGraph
+
+def read_bundle(version: str)->ArtifactBundle:
+    return ArtifactBundle(
+        version=version,
+        data=read_published_frame("cleaned", version),
+        price_cube=read_published_frame("price_cube", version),
+        geometries=read_published_geometries(version),
+        adjacency=read_published_adjacency(version)
+    )
+
+if __name__ == "__main__":
+    from src.dvf_processing.clean_data import read_cleaned_data
+    from src.dvf_processing.price_cube import read_price_cube, build_price_cube
+    from src.cadastres.geometry_store import load_section_geometries
+    from src.cadastres.adjacency_graph import load_adjacency_graph
+    from src.dvf_processing.section_index import index_sort_cols
+
+    # published in index order, so the app's SectionIndex needs no sort
+    df = read_cleaned_data().sort(index_sort_cols)
+    cube = read_price_cube()
+    publish_artifacts(
+        {"cleaned": df, "price_cube": cube if cube is not None else build_price_cube(df)},
+        load_section_geometries(),
+        load_adjacency_graph()
+    )
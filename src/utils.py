@@ -6,4 +6,8 @@ def save_json(
         json_input: dict
 )->None:
     with open(file_path, "w") as f:
-        json.dump(json_input, f)
\ No newline at end of file
+        json.dump(json_input, f)
+def load_json(file_path: Path)->dict:
+    with open(file_path, "r") as f:
+        json_file = json.load(f)
+    return json_file